@@ -5,7 +5,10 @@ This module handle the controller that handle all the request to the Spotify API
 
 """
 
+import argparse
 import beatlistController
+import batchrunner
+import metrics
 import sys
 
 
@@ -14,7 +17,7 @@ def generate_playlist_from_scratch(controller_beatlist: beatlistController.Contr
 
     The module:
         1. call the controller method to extract the required data from a source (load or Spotify).
-        2. call the controller method to filter the data based on a tempo.
+        2. call the controller method to filter the data based on a tempo or a features query.
         3. call the controller method for the playlist creation (name and POST to Spotify API).
         4. call the controller method to add tracks to the created playlist.
 
@@ -25,11 +28,26 @@ def generate_playlist_from_scratch(controller_beatlist: beatlistController.Contr
 
     """
     if controller_beatlist.extract_data_from_source():  # Extract tracks data from source (Spotify or local databse)
-        controller_beatlist.extract_tracks_based_on_tempo()  # Extract tracks based on tempo.
+        controller_beatlist.extract_tracks_for_playlist()  # Extract tracks based on tempo or on a features query.
         controller_beatlist.create_the_spotify_playlist()  # Send request to create the playlist with the tracks
         controller_beatlist.add_tracks_to_playlist()  # Send request to add tracks to the playlist
 
 
+def generate_playlist_streaming(controller_beatlist: beatlistController.Controller):
+    """Generate a playlist while the source is still being extracted from Spotify.
+
+    The track IDs, audio features, tempo filter and playlist additions run as a streaming pipeline, the first matching tracks are added
+    to the playlist before the end of the extraction.
+
+    Parameters
+    ----------
+    controller_beatlist: beatlistController.Controller
+        controller for the project.
+
+    """
+    controller_beatlist.generate_playlist_streaming()
+
+
 def analyse_a_playlist(controller_beatlist):  # Extracts all the tracks data of a playlist and give the general stats of the server. Show a box plot graph of the stats
     if controller_beatlist.extract_data_from_source():  # Extract data from source (Spotify or local databse)
         controller_beatlist.analyse_tracks_data()
@@ -77,8 +95,9 @@ def connexion_menu():
 def main_menu(controller_beatlist):
     choice = 0
     header_menu = 'Main menu: '
-    menu_list = ['Save tracks to local database', 'Delete a table from local database', 'Generate a playlist', 'Analyse a playlist']
-    while 1 > choice or choice > 5:
+    menu_list = ['Save tracks to local database', 'Delete a table from local database', 'Generate a playlist', 'Analyse a playlist',
+                 'Generate a playlist directly from Spotify (streaming)', 'Export or import a local source (Parquet/Arrow file)']
+    while 1 > choice or choice > len(menu_list) + 1:
         choice = beatlistController.menu_generator(header=header_menu, menu_list=menu_list, exit_choice=True)
 
     if choice == 1:
@@ -89,6 +108,10 @@ def main_menu(controller_beatlist):
         generate_playlist_from_scratch(controller_beatlist)
     elif choice == 4:
         analyse_a_playlist(controller_beatlist)
+    elif choice == 5:
+        generate_playlist_streaming(controller_beatlist)
+    elif choice == 6:
+        controller_beatlist.export_or_import_local_source()
     elif choice == len(menu_list) + 1:
         print('End of program')
         sys.exit()
@@ -97,9 +120,23 @@ def main_menu(controller_beatlist):
 
 
 def main():
-    controller_beatlist = connexion_menu()
-
-    main_menu(controller_beatlist)
+    parser = argparse.ArgumentParser(description='Analyse songs and create Spotify playlists based on their tempo.')
+    parser.add_argument('--job', help='JSON job spec to run without any prompt (see the batchrunner module).')
+    parser.add_argument('--metrics', help='File that receives the request and SQLite metrics at the end of the run (.prom for Prometheus '
+                                          'text, JSON otherwise).')
+    args = parser.parse_args()
+
+    try:
+        if args.job:  # Headless batch mode, for scheduled runs.
+            batchrunner.run_job_file(args.job)
+            return
+
+        controller_beatlist = connexion_menu()
+
+        main_menu(controller_beatlist)
+    finally:
+        if args.metrics:
+            metrics.registry.save(args.metrics)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,238 @@
+"""
+Module for asynchronous Spotify API GET and POST request.
+
+This module mirror the SpotifyAPI class on top of asyncio and aiohttp so many extractions can run side by side on one event loop.
+- The authorization flow stays in SpotifyAPI, this client start from an access token.
+- All the requests share one semaphore (maximum requests in flight) and one rate limiter.
+
+"""
+
+import asyncio
+import datetime
+import email.utils
+import math
+import random
+import time
+
+import aiohttp
+
+from trackrecord import TrackRecord
+
+
+class AsyncRateLimiter(object):
+    """Token bucket shared by every coroutine doing requests with the same AsyncSpotifyAPI object."""
+
+    def __init__(self, rate=10.0, capacity=10):
+        self.rate = rate  # Tokens added per second.
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_update = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):  # Wait until one request can be sent.
+        while True:
+            async with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_update) * self.rate)
+                self.last_update = now
+                if self.tokens >= 1:
+                    self.tokens = self.tokens - 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait_time)
+
+
+class AsyncSpotifyAPI(object):
+
+    # Variables.
+    access_token = None
+    user_id = ''
+    api_url = 'https://api.spotify.com/v1'
+    max_concurrency = 10
+    max_retry = 5
+    backoff_base = 0.5  # Seconds.
+    backoff_max = 30.0  # Seconds.
+    session = None
+    semaphore = None
+    rate_limiter = None
+
+    def __init__(self, access_token, max_concurrency=10, requests_per_second=10.0, max_retry=5, api_url=None):
+        self.access_token = access_token
+        self.max_concurrency = max_concurrency
+        self.max_retry = max_retry
+        self.requests_per_second = requests_per_second
+        if api_url is not None:
+            self.api_url = api_url
+
+    @classmethod
+    def from_spotify_API(cls, spotify_API, **kwargs):  # Reuse the token of an authenticated SpotifyAPI object.
+        async_API = cls(spotify_API.get_access_token(), api_url=spotify_API.api_url, **kwargs)
+        async_API.user_id = spotify_API.get_user_id()
+        return async_API
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):  # The session, semaphore and limiter must be created inside the running event loop.
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        self.session = aiohttp.ClientSession(connector=connector, headers={'Authorization': 'Bearer ' f'{self.access_token}'})
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.rate_limiter = AsyncRateLimiter(rate=self.requests_per_second, capacity=max(1, int(self.requests_per_second)))
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def set_access_token(self, access_token):
+        self.access_token = access_token
+        if self.session is not None:
+            self.session.headers['Authorization'] = 'Bearer ' f'{self.access_token}'
+
+    def get_backoff_time(self, attempt):  # Exponential backoff with full jitter.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get_retry_after_time(self, retry_after):  # Seconds to wait from a Retry-After header (seconds or HTTP-date), None if invalid.
+        if retry_after is None:
+            return None
+        try:
+            seconds = float(retry_after)
+        except ValueError:
+            pass
+        else:
+            return max(0.0, seconds) if math.isfinite(seconds) else None
+        try:
+            retry_date = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError, IndexError):
+            return None
+        if retry_date.tzinfo is None:  # An HTTP-date is always in GMT.
+            retry_date = retry_date.replace(tzinfo=datetime.timezone.utc)
+        return max(0.0, (retry_date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+    async def send_request(self, method, query, idempotent=True, **kwargs):  # Every request goes through this coroutine, return the JSON response.
+        # A request that is not idempotent (playlist creation, tracks add) is only retried when Spotify did not process it: on a 429 or
+        # when the connection failed. A 5xx, a timeout or a dropped connection can come after the request was applied.
+        for attempt in range(self.max_retry + 1):
+            await self.rate_limiter.acquire()
+            try:
+                async with self.semaphore:
+                    async with self.session.request(method, query, **kwargs) as response:
+                        if response.status == 429 or (response.status >= 500 and idempotent):
+                            retry_after = self.get_retry_after_time(response.headers.get('retry-after'))
+                            if attempt == self.max_retry:
+                                response.raise_for_status()
+                        else:
+                            response.raise_for_status()
+                            return await response.json()
+            except aiohttp.ClientConnectionError as e:
+                if attempt == self.max_retry or (not idempotent and not isinstance(e, aiohttp.ClientConnectorError)):
+                    raise
+                retry_after = None
+            except asyncio.TimeoutError as e:
+                if attempt == self.max_retry or not idempotent:  # Raised as a ClientError, like the other failures handled by the callers.
+                    raise aiohttp.ServerTimeoutError("Timeout of the request to " + str(query)) from e
+                retry_after = None
+            if retry_after is not None:
+                await asyncio.sleep(retry_after)
+            else:
+                await asyncio.sleep(self.get_backoff_time(attempt))
+
+    async def paginate(self, query, params=None):  # Follow the 'next' links and yield the items page by page.
+        while query:
+            try:
+                response_json = await self.send_request('GET', query, params=params)
+            except aiohttp.ClientError as e:
+                print("Extraction stop because of error: " + str(e))
+                return
+            for item in response_json['items']:
+                yield item
+            query = response_json['next']
+            params = None  # The 'next' link already contains the query parameters.
+
+    async def extract_current_user_id(self):
+        try:
+            response_json = await self.send_request('GET', self.api_url + '/me')
+        except aiohttp.ClientError as e:
+            print(e)
+        else:
+            self.user_id = response_json['id']
+        return self.user_id
+
+    def get_user_id(self):
+        return self.user_id
+
+    async def extract_list_of_user_playlist(self):
+        query = self.api_url + '/users/'f'{self.user_id}''/playlists'
+        return [[item['name'], item['id']] async for item in self.paginate(query, params={'limit': '50'})]
+
+    async def iter_tracks_IDs_from_playlist(self, playlist_ID):
+        query = self.api_url + '/playlists/'f'{playlist_ID}''/tracks'
+        params = {
+            'limit': '100',
+            'fields': 'items(track(id)),next',
+        }
+
+        async for item in self.paginate(query, params=params):
+            if item['track'] is not None and item['track']['id'] is not None:  # Local files and removed tracks have no ID.
+                yield item['track']['id']
+
+    async def extract_tracks_IDs_from_playlist(self, playlist_ID):
+        return [track_ID async for track_ID in self.iter_tracks_IDs_from_playlist(playlist_ID)]
+
+    async def extract_saved_tracks_IDs(self):
+        query = self.api_url + '/me/tracks'
+        return [item['track']['id'] async for item in self.paginate(query, params={'limit': '50', 'offset': '0'}) if item['track']['id'] is not None]
+
+    async def extract_library_albums_IDs(self):
+        query = self.api_url + '/me/albums'
+        return [item['album']['id'] async for item in self.paginate(query, params={'limit': '50', 'offset': '0'})]
+
+    async def extract_tracks_IDs_from_one_album(self, album_ID):
+        query = self.api_url + '/albums/'f'{album_ID}''/tracks'
+        return [item['id'] async for item in self.paginate(query, params={'limit': '50'})]
+
+    async def extract_tracks_IDs_from_album(self, album_IDs_list):
+        albums_tracks_IDs = await asyncio.gather(*(self.extract_tracks_IDs_from_one_album(album_ID) for album_ID in album_IDs_list))
+        return [track_ID for album_tracks_IDs in albums_tracks_IDs for track_ID in album_tracks_IDs]  # gather() keep the album order.
+
+    async def extract_tracks_data_of_one_batch(self, track_IDs_batch):
+        try:
+            response_json = await self.send_request('GET', self.api_url + '/audio-features', params={'ids': ','.join(track_IDs_batch)})
+        except aiohttp.ClientError as e:
+            print("Extraction of a batch of tracks failed because of error: " + str(e))
+            return list()
+        return [TrackRecord.from_dict(item) for item in response_json['audio_features'] if item is not None]  # Tracks without features are returned as null.
+
+    async def extract_tracks_data_in_batches(self, track_IDs_list, batch_size=100):
+        batch_size = max(1, min(batch_size, 100))  # The API accepts at most 100 IDs per request.
+        batches = [track_IDs_list[i:i + batch_size] for i in range(0, len(track_IDs_list), batch_size)]
+        batches_data = await asyncio.gather(*(self.extract_tracks_data_of_one_batch(batch) for batch in batches))
+        return [item for batch_data in batches_data for item in batch_data]
+
+    async def create_a_playlist(self, playlist_name):
+        query = self.api_url + '/users/'f'{self.user_id}''/playlists'
+        data = {
+            'name': f'{playlist_name}',
+            'public': False
+        }
+
+        try:
+            response_json = await self.send_request('POST', query, idempotent=False, json=data)
+        except aiohttp.ClientError as e:
+            print(e)
+            return ''
+        return response_json['id']
+
+    async def add_tracks_to_a_playlist(self, playlist_ID, track_URIs):
+        query = self.api_url + '/playlists/'f'{playlist_ID}''/tracks'
+
+        try:
+            for i in range(0, len(track_URIs), 100):  # The API accepts at most 100 URIs per request, the order is kept.
+                await self.send_request('POST', query, idempotent=False, json={'uris': track_URIs[i:i + 100]})
+            return True
+        except aiohttp.ClientError:
+            return False
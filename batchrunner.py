@@ -0,0 +1,207 @@
+"""
+Headless batch runner for the playlist generation.
+
+This module runs a job spec without any prompt so it can be scheduled (cron, etc.):
+- the tracks data of all the sources are loaded once,
+- every tempo or features query of the job run against the same in-memory dataset,
+- the playlists are created and filled in bulk, and the throughput of each query is reported.
+
+The Spotify authorization must have been granted once with the interactive program, the runner reuse the saved refresh token.
+
+Job spec example (JSON):
+    {
+        "sources": [{"type": "local", "name": "liked_tracks"}, {"type": "playlist", "name": "Running"}, {"type": "saved_albums"}],
+        "playlists": [
+            {"name": "Run 170", "tempo": 170, "tolerance": 0.05, "include_multiples": true},
+            {"name": "Energy", "query": "tempo=165±5%, energy>0.7, danceability~0.8", "max_tracks": 50}
+        ],
+        "max_workers": 4,
+        "output": "job_report.json",
+        "metrics": "job_metrics.prom",
+        "charts": {"directory": "charts", "format": "png", "layout": "grid"},
+        "stats": true
+    }
+The source types are 'local' (a source of the local database, all the local tracks without name), 'playlist', 'liked_tracks' and
+'saved_albums'. The optional 'metrics' file receives the request and SQLite metrics of the run (Prometheus text for a .prom file, JSON
+otherwise). The optional 'charts' renders the histogram and box plot of every numeric parameter of the loaded tracks without any GUI, the
+layout is 'grid' (one figure) or 'files' (one file per parameter) and an unchanged dataset reuses the previous render. With 'stats', the
+report gives the mean, std, min, quartiles and max of each parameter for each source and for all the sources merged.
+
+"""
+
+import contextlib
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import datamanager
+import metrics
+import spotifyAPI
+import streamingstats
+import tracksanalyser
+
+
+def connect_to_spotify(data_manager, max_workers=4):
+    """Return an authenticated SpotifyAPI object from the saved credentials, without any prompt."""
+    if not data_manager.is_client_info_exist() or not data_manager.is_auth_granted():
+        raise RuntimeError("No Spotify authorization found, run BeatList once in interactive mode to grant it.")
+
+    client_ID, client_secret = data_manager.extract_client_info_from_file()
+    spotify_API = spotifyAPI.SpotifyAPI(client_ID, client_secret, max_workers=max_workers)
+    spotify_API.set_token_callback(data_manager.save_tokens_to_file)
+    spotify_API.set_refresh_token(data_manager.extract_line_info(5))
+    access_token = spotify_API.refresh()
+    if not access_token:
+        raise RuntimeError("The access token could not be refreshed.")
+    spotify_API.start_token_refresher()  # Long jobs outlive the one hour access token.
+    spotify_API.extract_current_user_id()
+    return spotify_API
+
+
+def extract_source_track_IDs(spotify_API, source):
+    if source['type'] == 'playlist':
+        playlist_ID = spotify_API.get_playlist_ID(source['name'])
+        if not playlist_ID:
+            raise ValueError("Playlist " + source['name'] + " not found")
+        return spotify_API.iter_tracks_IDs_from_playlist(playlist_ID)
+    elif source['type'] == 'liked_tracks':
+        return spotify_API.iter_saved_tracks_IDs()
+    elif source['type'] == 'saved_albums':
+        return spotify_API.iter_tracks_IDs_from_saved_albums()
+    raise ValueError("Unknown source type: " + str(source['type']))
+
+
+def load_tracks_data(spotify_API, data_manager, sources, sources_stats=None):
+    """Load the tracks data of all the sources once, a track present in several sources is kept once.
+
+    When sources_stats is a list, the streaming statistics of each source are appended to it while its batches are read.
+    """
+    tracks_data = list()
+    track_IDs = set()
+
+    data_manager.connect_to_database()
+    try:
+        for source in sources:
+            if source['type'] == 'local':
+                batches = data_manager.iter_tracks_data_from_source(source.get('name'))
+            else:
+                batches = spotify_API.iter_tracks_data_in_batches(extract_source_track_IDs(spotify_API, source), cache=data_manager)
+            source_stats = streamingstats.FeatureStats() if sources_stats is not None else None
+            for batch in batches:
+                if source_stats is not None:
+                    source_stats.update_many(batch)
+                for track in batch:
+                    if track['id'] not in track_IDs:
+                        track_IDs.add(track['id'])
+                        tracks_data.append(track)
+            if sources_stats is not None:
+                sources_stats.append(source_stats)
+    finally:
+        data_manager.close_database()
+
+    return tracks_data
+
+
+def select_track_URIs(playlist_job, tempo_index, feature_matrix):
+    """Return the URIs of the tracks matching one playlist job of the spec."""
+    max_tracks = playlist_job.get('max_tracks')
+
+    if 'query' in playlist_job:
+        conditions, target = tracksanalyser.parse_feature_query(playlist_job['query'])
+        output_tracks = feature_matrix.query(conditions, target, max_tracks)
+    elif 'tempo' in playlist_job:
+        output_tracks = tempo_index.query(float(playlist_job['tempo']), float(playlist_job.get('tolerance', 0.1)),
+                                          include_multiples=bool(playlist_job.get('include_multiples', False)))
+    else:
+        raise ValueError("Playlist " + playlist_job['name'] + " needs a 'tempo' or a 'query'")
+
+    return tracksanalyser.extract_tracks_URI_IDs(output_tracks)[:max_tracks]
+
+
+def run_job(job, data_manager=None, spotify_API=None):
+    """Run one job spec and return its report (dict)."""
+    data_manager = data_manager or datamanager.DataManager()
+    max_workers = int(job.get('max_workers', 4))
+    spotify_API = spotify_API or connect_to_spotify(data_manager, max_workers=max_workers)
+    report = {'sources': job['sources'], 'playlists': list()}
+
+    start_time = time.perf_counter()
+    sources_stats = list() if job.get('stats') else None
+    tracks_data = load_tracks_data(spotify_API, data_manager, job['sources'], sources_stats=sources_stats)
+    tracks_table = tracksanalyser.TrackTable.from_tracks_data(tracks_data)
+    tempo_index = tracksanalyser.TempoIndex(tracks_table)
+    feature_matrix = tracksanalyser.FeatureMatrix(tracks_table)
+    report['tracks_loaded'] = len(tracks_table)
+    report['load_seconds'] = round(time.perf_counter() - start_time, 3)
+
+    if sources_stats is not None:  # The merged stats count a track once per source that contains it.
+        merged_stats = streamingstats.FeatureStats()
+        for source_stats in sources_stats:
+            merged_stats.merge(source_stats)
+        report['stats'] = {'sources': [source_stats.summary() for source_stats in sources_stats], 'merged': merged_stats.summary()}
+
+    if job.get('charts'):
+        charts = job['charts']
+        report['charts'] = tracksanalyser.render_statistics_graphs(tracks_table, charts.get('directory', 'charts'),
+                                                                   file_format=charts.get('format', 'png'), layout=charts.get('layout', 'grid'))
+
+    playlists = list()
+    for playlist_job in job['playlists']:
+        query_start_time = time.perf_counter()
+        track_URIs = select_track_URIs(playlist_job, tempo_index, feature_matrix)
+        query_seconds = time.perf_counter() - query_start_time
+        playlists.append((playlist_job, track_URIs, query_seconds))
+
+    def submit(playlist):
+        playlist_job, track_URIs, query_seconds = playlist
+        submit_start_time = time.perf_counter()
+        result = spotify_API.create_playlist_with_tracks(playlist_job['name'], track_URIs)
+        submit_seconds = time.perf_counter() - submit_start_time
+        return {
+            'name': playlist_job['name'],
+            'playlist_ID': result['playlist_ID'],
+            'tracks_matched': len(track_URIs),
+            'tracks_added': len(result['added_URIs']),
+            'tracks_failed': len(result['failed_URIs']),
+            'query_seconds': round(query_seconds, 6),
+            'submit_seconds': round(submit_seconds, 3),
+            'tracks_per_second': round(len(result['added_URIs']) / submit_seconds, 1) if submit_seconds > 0 else None,
+        }
+
+    submit_start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:  # map() keep the playlists in the job order.
+        report['playlists'] = list(executor.map(submit, playlists))
+    report['submit_seconds'] = round(time.perf_counter() - submit_start_time, 3)
+    report['total_seconds'] = round(time.perf_counter() - start_time, 3)
+    report['requests'] = {
+        'sent': spotify_API.metrics.get_counter('spotify_requests_total'),
+        'rate_limited': spotify_API.metrics.get_counter('spotify_rate_limited_total'),
+        'retries': spotify_API.metrics.get_counter('spotify_retries_total'),
+        'features_cache_hits': data_manager.metrics.get_counter('features_cache_hits_total'),
+        'features_cache_misses': data_manager.metrics.get_counter('features_cache_misses_total'),
+    }
+
+    return report
+
+
+def run_job_file(job_path):
+    """Run the job spec saved in a JSON file, print the report and save it in the job 'output' file if any.
+
+    The progress and error messages of the run go to stderr, so stdout only holds the JSON report (e.g. for a cron job > report.json).
+    """
+    with open(job_path, 'r') as f:
+        job = json.load(f)
+
+    with contextlib.redirect_stdout(sys.stderr):  # The extraction threads print their progress too.
+        report = run_job(job)
+    if job.get('metrics'):
+        metrics.registry.save(job['metrics'])
+    report_json = json.dumps(report, indent=2)
+    print(report_json)
+
+    if job.get('output'):
+        with open(job['output'], 'w') as f:
+            f.write(report_json)
+
+    return report
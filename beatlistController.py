@@ -9,6 +9,8 @@ trackanalyser module.
 import spotifyAPI
 import datamanager
 import tracksanalyser
+import pipeline
+import streamingstats
 import os
 import unicodedata
 
@@ -40,6 +42,10 @@ def menu_generator(header="", menu_list=None, exit_choice=False):
     return choice
 
 
+def get_playlist_source_name(playlist_name):
+    return 'playlist_' + strip_accents(playlist_name.replace(" ", "_").replace("-", "_"))
+
+
 def strip_accents(text):
     try:
         text.encode('utf-8')
@@ -80,10 +86,17 @@ class Controller(object):
     expires = None
     connect = None
     tracks_data = list()
+    tracks_table = None  # Columnar copy of tracks_data, built once per loaded dataset.
+    tempo_index = None  # Sorted tempo index of tracks_table, built on the first tempo request.
+    feature_matrix = None  # Normalized feature matrix of tracks_table, built on the first features request.
+    data_from_local_database = False
+    local_source = None  # Local source of the loaded tracks data, None for all the tracks of the local database.
+    pending_sync = None  # Sync state of the last extraction from Spotify, saved with its tracks data.
     output_data = None
     output_track_IDs = None
     playlist_ID = None
     parameter_list = None
+    max_workers = 4  # Concurrent requests allowed for the parallel extraction modes.
 
     debug = 0
 
@@ -98,8 +111,7 @@ class Controller(object):
             print("No client_ID and client_Secret found. Please provide the required credentials to continue.")
             self.client_ID = input("Client_ID: ")
             self.client_secret = input("Client_Secret: ")
-            self.data_manager.save_line_info('1', 0)  # v1) 1 for client info in file. Should have some way to verify if info are reliable.
-            self.data_manager.save_client_info_to_file(self.client_ID, self.client_secret)
+            self.data_manager.save_lines_info({0: '1', 1: self.client_ID, 2: self.client_secret})  # v1) 1 for client info in file. Should have some way to verify if info are reliable.
         else:
             choice = ''
             self.client_ID, self.client_secret = self.data_manager.extract_client_info_from_file()
@@ -115,21 +127,21 @@ class Controller(object):
                     print("Choose new client_ID and client_Secret")
                     self.client_ID = input("Client_ID: ")
                     self.client_secret = input("Client_Secret: ")
-                    self.data_manager.save_client_info_to_file(self.client_ID, self.client_secret)
-                    self.data_manager.save_authentification_to_file('0')
+                    self.data_manager.save_lines_info({1: self.client_ID, 2: self.client_secret, 3: '0'})
 
     def get_authentification(self):  # looks for authentification key and ask for it if not found.
         client_id = self.client_ID
         client_secret = self.client_secret
         if client_id is not None and client_secret is not None:
-            self.spotify_API = spotifyAPI.SpotifyAPI(client_id, client_secret)  # spotifyAPI class to handle all POST and GET request to the API.
+            self.spotify_API = spotifyAPI.SpotifyAPI(client_id, client_secret, max_workers=self.max_workers)  # spotifyAPI class to handle all POST and GET request to the API.
+            self.spotify_API.set_token_callback(self.data_manager.save_tokens_to_file)  # Every new token is saved, also the background ones.
             if not self.data_manager.is_auth_granted():
                 clear_interpreter()
                 self.spotify_API.request_auth()
                 [request_success, access_token, refresh_token] = self.spotify_API.extract_access_token()
                 if request_success:
-                    self.data_manager.save_line_info('1', 3)
-                    self.data_manager.save_tokens_to_file(access_token, refresh_token)
+                    self.data_manager.save_authentification_to_file('1')
+                    self.spotify_API.start_token_refresher()
                     self.connect = True
                     return True
                 else:
@@ -137,17 +149,18 @@ class Controller(object):
                     self.connect = False
                     return False
 
-            elif self.spotify_API.is_expire:  # Verify if the access token is still valid, if not, do a request to have a new one.
+            elif self.spotify_API.is_expire():  # Verify if the access token is still valid, if not, do a request to have a new one.
                 is_Request_Successful = self.request_refresh()
-                self.connect = True
+                if is_Request_Successful:
+                    self.spotify_API.start_token_refresher()
+                self.connect = is_Request_Successful
                 return is_Request_Successful
 
     def request_refresh(self):
         refresh_token = self.data_manager.extract_line_info(5)
         self.spotify_API.set_refresh_token(refresh_token)
-        access_token = self.spotify_API.refresh()
-        if access_token is not None:
-            self.data_manager.save_line_info(access_token, 4)
+        access_token = self.spotify_API.refresh()  # The token callback saves the new tokens.
+        if access_token:
             return True
         else:
             return False
@@ -174,59 +187,61 @@ class Controller(object):
         data_source_choice = 0
         while 1 > data_source_choice or data_source_choice > len(menu_list) + 1:
             data_source_choice = menu_generator(header=header, menu_list=menu_list, exit_choice=True)
+            self.data_from_local_database = False
 
             if data_source_choice == 1:  # Tracks data extraction from local SQL database.
                 self.tracks_data = self.extract_data_from_local_database()
-                self.parameter_list = tracksanalyser.extract_parameter_list(self.tracks_data)
 
             elif data_source_choice == 2:  # Tracks data extraction from API request.
                 spotify_source_type = "playlist"
 
                 try:
                     playlist_name, self.tracks_data = self.extract_data_from_spotify(spotify_source_type)
-                    self.parameter_list = tracksanalyser.extract_parameter_list(self.tracks_data)
                 except TypeError:
                     self.tracks_data = list()
+                    self.tracks_table = None
                     return False
                 else:
-                    choice = ""
-
-                while choice.upper() != 'Y' and choice.upper() != 'N':  # Choice to replace the local SQL database with new data.
-                    clear_interpreter()
-                    choice = input("\nDo you want to save the data in the local database? (Y/N): ")
-                if choice.upper() == 'Y':
-                    table = 'playlist_' + strip_accents(playlist_name.replace(" ", "_").replace("-", "_"))
-                    self.save_data_to_local_database(table, self.tracks_data)
+                    self.ask_to_save_data_to_local_database(get_playlist_source_name(playlist_name))
 
             elif data_source_choice == 3:
                 spotify_source_type = "liked_tracks"
                 self.tracks_data = self.extract_data_from_spotify(spotify_source_type)
-                choice = ""
-                while choice.upper() != 'Y' and choice.upper() != 'N':  # Choice to replace the local SQL database with new data.
-                    clear_interpreter()
-                    choice = input("\nDo you want to save the data in the local database? (Y/N): ")
-                if choice.upper() == 'Y':
-                    table = 'liked_tracks'
-                    self.save_data_to_local_database(table, self.tracks_data)
+                self.ask_to_save_data_to_local_database('liked_tracks')
 
             elif data_source_choice == 4:
                 spotify_source_type = "saved_albums"
                 self.tracks_data = self.extract_data_from_spotify(spotify_source_type)
-                choice = ""
-                while choice.upper() != 'Y' and choice.upper() != 'N':  # Choice to replace the local SQL database with new data.
-                    clear_interpreter()
-                    choice = input("\nDo you want to save the data in the local database? (Y/N): ")
-                if choice.upper() == 'Y':
-                    table = 'saved_albums'
-                    self.save_data_to_local_database(table, self.tracks_data)
+                self.ask_to_save_data_to_local_database('saved_albums')
 
             elif data_source_choice == len(menu_list) + 1:
                 self.tracks_data = None
 
+        self.tempo_index = None
+        self.feature_matrix = None
+        if self.tracks_data:
+            self.tracks_table = tracksanalyser.TrackTable.from_tracks_data(self.tracks_data)
+            self.parameter_list = tracksanalyser.extract_parameter_list(self.tracks_table)
+        else:
+            self.tracks_table = None
+
         return True
 
+    def ask_to_save_data_to_local_database(self, source):
+        if self.pending_sync is not None and self.pending_sync['unchanged']:
+            print("\nThe source " + source + " has not changed since the last sync.")
+            return
+
+        choice = ""
+        while choice.upper() != 'Y' and choice.upper() != 'N':  # Choice to replace the local SQL database with new data.
+            clear_interpreter()
+            choice = input("\nDo you want to save the data in the local database? (Y/N): ")
+        if choice.upper() == 'Y':
+            self.save_data_to_local_database(source, self.tracks_data)
+
     def extract_data_from_spotify(self, spotify_source_type):
         spotify_source_type = spotify_source_type
+        self.pending_sync = None
         if spotify_source_type == 'playlist':
             playlist_info = self.spotify_API.extract_list_of_user_playlist()
             playlist_name = [info[0] for info in playlist_info]
@@ -237,122 +252,322 @@ class Controller(object):
                 choice = menu_generator(header='From which playlist?', menu_list=playlist_name, exit_choice=True)
 
             if choice <= len(playlist_name):
-                track_IDs_list = self.spotify_API.extract_tracks_IDs_from_playlist(playlist_id[choice - 1])
-                tracks_data = self.spotify_API.extract_tracks_data(track_IDs_list)
+                source = get_playlist_source_name(playlist_name[choice - 1])
+                snapshot_ID = playlist_info[choice - 1][2]
+
+                self.data_manager.connect_to_database()  # The playlist is skipped if its snapshot_id is the one of the last sync.
+                is_unchanged = self.data_manager.is_source_exist(source) and self.data_manager.read_sync_state(source)[0] == snapshot_ID
+                tracks_data = self.data_manager.read_tracks_data_from_source(source) if is_unchanged else list()
+                self.data_manager.close_database()
+
+                failed_extractions = self.spotify_API.get_failed_extractions()
+                if not is_unchanged:
+                    track_IDs = self.spotify_API.iter_tracks_IDs_from_playlist(playlist_id[choice - 1])
+                    tracks_data = self.extract_tracks_data_with_cache(track_IDs)
+                self.pending_sync = {
+                    'source': source,
+                    'snapshot_ID': snapshot_ID,
+                    'watermark': None,
+                    'unchanged': is_unchanged,
+                    'new_tracks_data': None,
+                    'complete': self.spotify_API.get_failed_extractions() == failed_extractions,
+                }
                 return playlist_name[choice - 1], tracks_data
 
         elif spotify_source_type == 'liked_tracks':
-            track_IDs = self.spotify_API.extract_saved_tracks_IDs()
-            tracks_data = self.spotify_API.extract_tracks_data(track_IDs)
-            return tracks_data
+            return self.extract_incremental_data_from_spotify('liked_tracks', self.spotify_API.extract_saved_tracks_last_added_at,
+                                                              lambda added_after: self.spotify_API.iter_saved_tracks_IDs(added_after=added_after))
 
         elif spotify_source_type == 'saved_albums':
-            album_counter = 0
-            album_counts = 50
-            offset = 0
-            album_IDs_list = list()
-            while album_counts == 50:
-                album_IDs_buff = self.spotify_API.extract_library_albums_IDs(offset=offset)
-                album_counts = len(album_IDs_buff)
-                album_counter = album_counter + album_counts
-                offset = offset + album_counts
-                album_IDs_list = album_IDs_list + album_IDs_buff
-            print("\nNumber of album extracted: " + str(album_counter))
-            track_IDs = self.spotify_API.extract_tracks_IDs_from_album(album_IDs_list)
-            tracks_data = self.spotify_API.extract_tracks_data(track_IDs)
-            return tracks_data
+            def extract_albums_track_IDs(added_after):
+                album_IDs_list = self.spotify_API.extract_library_albums_IDs(added_after=added_after)
+                print("\nNumber of album extracted: " + str(len(album_IDs_list)))
+                return self.spotify_API.extract_tracks_IDs_from_albums_in_batches(album_IDs_list)
+
+            return self.extract_incremental_data_from_spotify('saved_albums', self.spotify_API.extract_library_albums_last_added_at, extract_albums_track_IDs)
         else:
             return None
 
+    def extract_incremental_data_from_spotify(self, source, extract_last_added_at, extract_track_IDs_added_after):
+        # Only the items saved after the watermark of the last sync are extracted, the other tracks come from the local database.
+        watermark = extract_last_added_at()  # Read before the extraction, the items saved meanwhile are extracted at the next sync.
+
+        self.data_manager.connect_to_database()
+        last_watermark = self.data_manager.read_sync_state(source)[1] if self.data_manager.is_source_exist(source) else None
+        old_tracks_data = self.data_manager.read_tracks_data_from_source(source) if last_watermark is not None else list()
+        self.data_manager.close_database()
+
+        failed_extractions = self.spotify_API.get_failed_extractions()
+        old_track_IDs = set(item['id'] for item in old_tracks_data)
+        track_IDs = (track_ID for track_ID in extract_track_IDs_added_after(last_watermark) if track_ID not in old_track_IDs)
+        new_tracks_data = self.extract_tracks_data_with_cache(track_IDs)
+
+        is_incremental = last_watermark is not None
+        is_complete = self.spotify_API.get_failed_extractions() == failed_extractions  # A page or a batch was skipped otherwise.
+        self.pending_sync = {
+            'source': source,
+            'snapshot_ID': None,
+            'watermark': watermark if watermark is not None else last_watermark,
+            'unchanged': is_incremental and is_complete and not new_tracks_data,
+            'new_tracks_data': new_tracks_data if is_incremental else None,
+            'complete': is_complete,
+        }
+        return new_tracks_data + old_tracks_data
+
+    def extract_tracks_data_with_cache(self, track_IDs):  # Only the tracks missing from the local cache are requested to Spotify.
+        self.data_manager.connect_to_database()
+        tracks_data = self.spotify_API.extract_tracks_data_in_batches(track_IDs, cache=self.data_manager)
+        print("\nTracks data cache hit rate: " + str(round(self.data_manager.get_cache_hit_rate() * 100, 1)) + "%")
+        self.data_manager.close_database()
+        return tracks_data
+
     def extract_data_from_local_database(self):
         self.data_manager.connect_to_database()
-        table_name = self.data_manager.extract_all_table_name()
-        choice = menu_generator(header='Which table?', menu_list=table_name)
-        tracks_data = self.data_manager.read_all_tracks_data_table(table_name[choice - 1])
+        source_name = self.data_manager.extract_all_source_name()
+        menu_list = source_name + ['All tracks']
+        choice = menu_generator(header='Which source?', menu_list=menu_list)
+        self.local_source = source_name[choice - 1] if choice <= len(source_name) else None
+        tracks_data = self.data_manager.read_tracks_data_from_source(self.local_source)
+        self.data_from_local_database = True
         self.data_manager.close_database()
         return tracks_data
 
-    def save_data_to_local_database(self, table, data):
+    def save_data_to_local_database(self, source, data):
         self.data_manager.connect_to_database()
+        pending_sync = self.pending_sync if self.pending_sync is not None and self.pending_sync['source'] == source else None
+        is_saved = True
 
-        if self.data_manager.is_table_exist(table):
-            header = '\nThe table: ' + table + ' exist. Do you want to flush the old data and replace it with new data?'
+        if pending_sync is not None and pending_sync['new_tracks_data'] is not None:  # Incremental sync, only the new tracks are added.
+            self.data_manager.write_tracks_data_to_source(source, pending_sync['new_tracks_data'])
+        elif self.data_manager.is_source_exist(source):
+            header = '\nThe source: ' + source + ' exist. Do you want to flush the old data and replace it with new data?'
             choice = menu_generator(header=header, menu_list=['Yes', 'No'])
             if choice == 1:
-                self.data_manager.clear_all_data_from_table(table)
-                self.data_manager.write_tracks_data_to_table(table, data)
+                self.data_manager.write_tracks_data_to_source(source, data, replace=True)
+            else:
+                is_saved = False
         else:
-            self.data_manager.write_tracks_data_to_table(table, data)
+            self.data_manager.write_tracks_data_to_source(source, data)
+
+        if is_saved and pending_sync is not None and not pending_sync['complete']:  # The next sync extracts the missing tracks again.
+            print("\nThe extraction was incomplete, the missing tracks will be extracted again at the next sync.")
+        elif is_saved and pending_sync is not None:
+            self.data_manager.save_sync_state(source, snapshot_ID=pending_sync['snapshot_ID'], watermark=pending_sync['watermark'])
 
         self.data_manager.close_database()
 
     def delete_table_from_local_database(self):
         self.data_manager.connect_to_database()
-        table_name = self.data_manager.extract_all_table_name()
-        menu_list = table_name
-        choice_header = 'Which table do you want to delete?'
+        source_name = self.data_manager.extract_all_source_name()
+        menu_list = source_name
+        choice_header = 'Which source do you want to delete?'
         choice = 0
         while 1 > choice or choice > len(menu_list) + 1:
             choice = menu_generator(header=choice_header, menu_list=menu_list, exit_choice=True)
-            if 0 < choice <= len(table_name):
-                choice_confirm_header = 'Are you sure you want to delete the table ' + table_name[choice - 1] + ' ?'
+            if 0 < choice <= len(source_name):
+                choice_confirm_header = 'Are you sure you want to delete the source ' + source_name[choice - 1] + ' ?'
                 menu_list_confirm = ['Yes', 'No']
                 choice_confirm = menu_generator(header=choice_confirm_header, menu_list=menu_list_confirm)
                 if choice_confirm == 1:
-                    if self.data_manager.drop_table(table_name[choice - 1]):
-                        print("Table " + table_name[choice - 1] + " have been deleted.")
+                    if self.data_manager.drop_source(source_name[choice - 1]):
+                        print("Source " + source_name[choice - 1] + " have been deleted.")
                     else:
-                        print("Table " + table_name[choice - 1] + "have not been deleted.")
-            elif choice == len(table_name) + 1:
-                return
+                        print("Source " + source_name[choice - 1] + " have not been deleted.")
+            elif choice == len(source_name) + 1:
+                break
 
         self.data_manager.close_database()
 
+    def export_or_import_local_source(self):  # Parquet or Arrow file chosen by the file extension.
+        header = 'Do you want to export a source of the local database to a file or import a file as a source?'
+        menu_list = ['Export a source to a Parquet/Arrow file', 'Import a Parquet/Arrow file as a source']
+        choice = 0
+        while 1 > choice or choice > len(menu_list) + 1:
+            choice = menu_generator(header=header, menu_list=menu_list, exit_choice=True)
+        if choice == len(menu_list) + 1:
+            return
+
+        self.data_manager.connect_to_database()
+        try:
+            if choice == 1:
+                source_name = self.data_manager.extract_all_source_name()
+                menu_list = source_name + ['All tracks']
+                source_choice = 0
+                while 1 > source_choice or source_choice > len(menu_list):
+                    source_choice = menu_generator(header='Which source do you want to export?', menu_list=menu_list, exit_choice=False)
+                source = source_name[source_choice - 1] if source_choice <= len(source_name) else None
+                default_path = (source or 'all_tracks') + '.parquet'
+                path = input("\nFile to create (.parquet, .arrow or .feather, default: " + default_path + "): ") or default_path
+                track_count = self.data_manager.export_source_to_file(source, path)
+                print(str(track_count) + " tracks exported to " + path)
+            else:
+                path = input("\nFile to import (.parquet, .arrow or .feather): ")
+                default_source = os.path.splitext(os.path.basename(path))[0]
+                source = input("Name of the source (default: " + default_source + "): ") or default_source
+                if self.data_manager.is_source_exist(source):
+                    confirm = menu_generator(header='The source ' + source + ' already exists, do you want to replace it?', menu_list=['Yes', 'No'])
+                    if confirm != 1:
+                        return
+                track_count = self.data_manager.import_source_from_file(path, source)
+                print(str(track_count) + " tracks imported in the source " + source)
+        except (ImportError, ValueError, OSError) as e:
+            print(e)
+        finally:
+            self.data_manager.close_database()
+
     def generate_graph_for_statistic(self):
         tracks_data = self.tracks_data
         if tracks_data is not None:
-            tracks_dataframe = tracksanalyser.convert_dataset_to_panda_dataframe(tracks_data)
             parameter = self.parameter_list
             choice = 0
-            menu_list = parameter
+            menu_list = parameter + ['All the parameters (saved to files)']
             header = 'For which parameter do you want to display the boxplot:'
-            while 1 > choice or choice > len(self.parameter_list):
+            while 1 > choice or choice > len(menu_list):
                 choice = menu_generator(header=header, menu_list=menu_list, exit_choice=False)
+            if choice == len(menu_list):
+                self.save_graphs_for_all_statistics()
+                return
+            tracks_dataframe = tracksanalyser.convert_dataset_to_panda_dataframe(tracks_data)
             tracksanalyser.generate_histogram_for_stat(tracks_dataframe, parameter[choice - 1])
         else:
             print("There is no data to plot.")
 
+    def save_graphs_for_all_statistics(self):  # Render all the parameters without any window, the files can be opened later.
+        output_directory = input("\nDirectory of the graphs (default: graphs): ") or 'graphs'
+        paths = tracksanalyser.render_statistics_graphs(self.tracks_table, output_directory)
+        print("Graphs saved in: " + ', '.join(paths))
+
     def extract_tracks_based_on_tempo(self):
         tracks_data = self.tracks_data
 
         if tracks_data:
             print("\nThe program will now sort the songs with the requested tempo (±10%): ")
-            tempo = input("Which tempo do you want: ")
-            tracks_data = self.tracks_data
+            tempo = float(input("Which tempo do you want: "))
+            choice = ""
+            while choice.upper() != 'Y' and choice.upper() != 'N':
+                choice = input("Do you want to include the half-time and double-time tracks? (Y/N): ")
+            include_multiples = choice.upper() == 'Y'
 
             # Sort tracks with the requested tempo.
-            output_tracks = tracksanalyser.extract_track_by_parameter_and_value(tracks_data, 'tempo', float(tempo), 0.1)
+            if self.data_from_local_database:  # The filter is done by SQLite on the indexed tempo column.
+                targets = [tempo, tempo / 2, tempo * 2] if include_multiples else [tempo]
+                output_tracks = list()
+                track_IDs = set()
+                self.data_manager.connect_to_database()
+                for target in targets:
+                    for track in self.data_manager.read_source_tracks_data_in_range(self.local_source, 'tempo', target - target * 0.1, target + target * 0.1):
+                        if track['id'] not in track_IDs:
+                            track_IDs.add(track['id'])
+                            output_tracks.append(track)
+                self.data_manager.close_database()
+            else:
+                if self.tempo_index is None:
+                    self.tempo_index = tracksanalyser.TempoIndex(self.tracks_table)
+                output_tracks = self.tempo_index.query(tempo, 0.1, include_multiples=include_multiples)
             self.output_track_IDs = tracksanalyser.extract_tracks_URI_IDs(output_tracks)
         else:
             print("No track data.")
 
+    def extract_tracks_based_on_features(self):
+        if self.tracks_data:
+            print("\nThe program will now sort the songs with the requested features.")
+            print("Example: tempo=165±5%, energy>0.7, danceability~0.8 (~ rank the tracks by distance to the value)")
+            query = input("Which features do you want: ")
+            count = input("Maximum number of tracks (empty for all): ")
+
+            try:
+                conditions, target = tracksanalyser.parse_feature_query(query)
+                if self.feature_matrix is None:
+                    self.feature_matrix = tracksanalyser.FeatureMatrix(self.tracks_table)
+                output_tracks = self.feature_matrix.query(conditions, target, int(count) if count.strip() else None)
+            except (KeyError, ValueError) as e:
+                print("Invalid features request: " + str(e))
+                self.output_track_IDs = list()
+            else:
+                self.output_track_IDs = tracksanalyser.extract_tracks_URI_IDs(output_tracks)
+        else:
+            print("No track data.")
+
+    def extract_tracks_for_playlist(self):
+        menu_list = ['Tempo', 'Features query']
+        choice = 0
+        while 1 > choice or choice > len(menu_list):
+            choice = menu_generator(header='How do you want to select the tracks?', menu_list=menu_list)
+
+        if choice == 1:
+            self.extract_tracks_based_on_tempo()
+        else:
+            self.extract_tracks_based_on_features()
+
+    def generate_playlist_streaming(self):  # Extract, filter and add the tracks at the same time, without keeping the whole library.
+        menu_list = ['Spotify Personnal Playlist', 'Spotify Liked Songs', 'Spotify Saved Albums']
+        choice = 0
+        while 1 > choice or choice > len(menu_list) + 1:
+            choice = menu_generator(header='From which source?', menu_list=menu_list, exit_choice=True)
+
+        if choice == 1:
+            playlist_info = self.spotify_API.extract_list_of_user_playlist()
+            playlist_name = [info[0] for info in playlist_info]
+            playlist_choice = 0
+            while 1 > playlist_choice or playlist_choice > len(playlist_name) + 1:
+                playlist_choice = menu_generator(header='From which playlist?', menu_list=playlist_name, exit_choice=True)
+            if playlist_choice > len(playlist_name):
+                return
+            track_IDs = self.spotify_API.iter_tracks_IDs_from_playlist(playlist_info[playlist_choice - 1][1])
+        elif choice == 2:
+            track_IDs = self.spotify_API.iter_saved_tracks_IDs()
+        elif choice == 3:
+            track_IDs = self.spotify_API.iter_tracks_IDs_from_saved_albums()
+        else:
+            return
+
+        print("\nThe program will sort the songs with the requested tempo (±10%): ")
+        tempo = float(input("Which tempo do you want: "))
+        multiples_choice = ""
+        while multiples_choice.upper() != 'Y' and multiples_choice.upper() != 'N':
+            multiples_choice = input("Do you want to include the half-time and double-time tracks? (Y/N): ")
+        include_multiples = multiples_choice.upper() == 'Y'
+
+        def tempo_filter(tracks_data):
+            return tracksanalyser.extract_tracks_URI_IDs(tracksanalyser.TempoIndex(tracks_data).query(tempo, 0.1, include_multiples=include_multiples))
+
+        self.create_the_spotify_playlist()
+        if not self.playlist_ID:
+            print("\nPlaylist not created...")
+            return
+
+        self.data_manager.connect_to_database()
+        generation_pipeline = pipeline.StreamingPipeline(self.spotify_API, track_IDs, tempo_filter, self.playlist_ID, cache=self.data_manager)
+        self.output_track_IDs = generation_pipeline.run()
+        self.data_manager.close_database()
+        print("\n" + generation_pipeline.get_status())
+        print("\nPlaylist generated with " + str(len(self.output_track_IDs)) + " tracks")
+
     def analyse_tracks_data(self):
         tracks_data = self.tracks_data
-        if tracks_data is not None:
-            self.output_data = tracksanalyser.extract_stats_from_tracks(tracks_data)
+        if tracks_data:
+            self.output_data = tracksanalyser.extract_stats_from_tracks(self.tracks_table)
             print("\nMean: ")
             print(self.output_data[0])
             print("\nStDev: ")
             print(self.output_data[1])
+            feature_stats = streamingstats.FeatureStats(parameters=self.tracks_table.get_parameter_list())
+            feature_stats.update_columns(self.tracks_table.numeric_columns, len(self.tracks_table))
+            print("\nQuartiles (Q1, median, Q3): ")
+            print({parameter: tuple(round(value, 2) if value is not None else None for value in (stats['q1'], stats['median'], stats['q3']))
+                   for parameter, stats in feature_stats.summary().items()})
         else:
             print("There is no data to analyse")
 
     def add_tracks_to_playlist(self):
         if self.playlist_ID:
             if self.spotify_API.is_user_playlist_ID_exist(self.playlist_ID):
-                result = self.spotify_API.add_tracks_to_a_playlist(self.playlist_ID, self.output_track_IDs)
-                if result:
-                    print("\nPlaylist generated successfully")
+                result = self.spotify_API.add_tracks_to_a_playlist_in_chunks(self.playlist_ID, self.output_track_IDs)
+                if not result['failed_URIs']:
+                    print("\nPlaylist generated successfully with " + str(len(result['added_URIs'])) + " tracks")
+                elif result['added_URIs']:
+                    print("\nPlaylist generated with " + str(len(result['added_URIs'])) + " tracks, " + str(len(result['failed_URIs'])) +
+                          " tracks have not been add to the playlist...")
                 else:
                     print("\nPlaylist name exist but tracks have not been add to the playlist...")
             else:
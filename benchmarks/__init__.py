@@ -0,0 +1,14 @@
+"""
+Offline benchmarks for BeatList.
+
+The benchmarks run against a local fake Spotify HTTP server (fakespotify) so the extraction, the SQLite save/load and the filter/stats
+paths can be timed at several library sizes without any network access. Run them from the project root with:
+    python -m benchmarks.run_benchmarks --sizes 1000,10000,100000 --output benchmark_results.json
+The startup time (import of the modules in a new interpreter) is measured separately with:
+    python -m benchmarks.startup_benchmarks --repeat 5 --output startup_results.json
+The async client (AsyncSpotifyAPI) is checked against the same fake server with:
+    python -m benchmarks.check_async_client --tracks 1000 --error-rate 0.2
+The analysis paths are checked on tracks with missing values (NULL tempo, energy, etc.) with:
+    python -m benchmarks.check_missing_values
+
+"""
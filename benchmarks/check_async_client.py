@@ -0,0 +1,120 @@
+"""
+Offline check of AsyncSpotifyAPI against the local fake Spotify server.
+
+The async client extracts a synthetic library while the fake server answers a ratio of the requests with a 429, then the results are
+compared to the library: pagination of the saved tracks, saved albums and playlist, audio features by batches of 100 IDs, tracks added
+to a new playlist by chunks of 100 URIs, a tracks add answered with a 502 that must not be sent again, and a timeout after the last
+retry. Run it from the project root with:
+    python -m benchmarks.check_async_client --tracks 1000 --error-rate 0.2
+
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+import aiohttp
+
+from asyncSpotifyAPI import AsyncSpotifyAPI
+from benchmarks.fakespotify import FakeSpotifyHandler, FakeSpotifyServer, SyntheticLibrary
+
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+    print("OK: " + message, file=sys.stderr)
+
+
+async def check_extraction(server, library, args):
+    async with AsyncSpotifyAPI('fake-access-token', requests_per_second=1000.0, max_retry=args.max_retry, api_url=server.api_url) as async_API:
+        check(await async_API.extract_current_user_id() == 'benchmark_user', "current user ID")
+
+        track_IDs = await async_API.extract_saved_tracks_IDs()
+        check(track_IDs == library.track_IDs, "saved tracks listed in order through the 'next' links")
+        check(await async_API.extract_tracks_IDs_from_playlist(library.playlist_ID) == library.track_IDs, "playlist tracks listed in order")
+        album_IDs = await async_API.extract_library_albums_IDs()
+        check(album_IDs == library.album_IDs, "saved albums listed in order")
+        check(await async_API.extract_tracks_IDs_from_album(album_IDs) == library.track_IDs, "album tracks listed in the album order")
+
+        answered_requests = server.stats['requests'] - server.stats['rate_limited']
+        tracks_data = await async_API.extract_tracks_data_in_batches(track_IDs)  # The fake server rejects more than 100 IDs.
+        check([item['id'] for item in tracks_data] == track_IDs, "audio features extracted by batches of 100 IDs")
+        answered_requests = server.stats['requests'] - server.stats['rate_limited'] - answered_requests
+        check(answered_requests == (len(track_IDs) + 99) // 100, "one request per batch of 100 IDs")
+
+        playlist_ID = await async_API.create_a_playlist('Async check')
+        check(playlist_ID != '', "playlist created")
+        track_URIs = [item['uri'] for item in tracks_data]
+        check(await async_API.add_tracks_to_a_playlist(playlist_ID, track_URIs), "tracks added by chunks of 100 URIs")
+        check(server.stats['tracks_added'] == len(track_URIs), "every track added once")
+
+    if server.error_rate:
+        check(server.stats['rate_limited'] > 0, str(server.stats['rate_limited']) + " responses with a 429 retried")
+
+
+class BadGatewayHandler(FakeSpotifyHandler):  # The first tracks add is applied, then answered with a 502 like a failing gateway.
+
+    def do_POST(self):
+        if self.path.endswith('/tracks') and not self.server.stats['tracks_added']:
+            uris = json.loads(self.read_body()).get('uris', list())
+            self.server.record('requests', 1)
+            self.server.record('tracks_added', len(uris))
+            self.send_json(502, {'error': {'status': 502, 'message': 'Bad gateway'}})
+            return
+        super().do_POST()
+
+
+async def check_not_idempotent(server, library):
+    track_URIs = ['spotify:track:' + track_ID for track_ID in library.track_IDs[:250]]
+    async with AsyncSpotifyAPI('fake-access-token', requests_per_second=1000.0, max_retry=5, api_url=server.api_url) as async_API:
+        async_API.backoff_max = 0.0
+        check(not await async_API.add_tracks_to_a_playlist('p', track_URIs), "tracks add answered with a 502 reported as failed")
+    check(server.stats['tracks_added'] == 100, "tracks add answered with a 502 not sent again")
+
+
+async def check_timeout(server):
+    timeout = aiohttp.ClientTimeout(total=server.latency / 4)
+    async with AsyncSpotifyAPI('fake-access-token', requests_per_second=1000.0, max_retry=1, api_url=server.api_url) as async_API:
+        async_API.backoff_max = 0.0
+        try:
+            await async_API.send_request('GET', server.api_url + '/me', timeout=timeout)
+        except aiohttp.ClientError:
+            check(True, "timeout raised as a ClientError after the last retry")
+        else:
+            raise AssertionError("The request did not time out")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the async Spotify client against a local fake Spotify API.")
+    parser.add_argument('--tracks', type=int, default=1000, help="size of the synthetic library (tracks)")
+    parser.add_argument('--error-rate', type=float, default=0.2, help="ratio of fake API requests answered with a 429")
+    parser.add_argument('--max-retry', type=int, default=20, help="retry budget of the async client")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    library = SyntheticLibrary(args.tracks, seed=args.seed)
+    server = FakeSpotifyServer(library, error_rate=args.error_rate, seed=args.seed).start()
+    try:
+        asyncio.run(check_extraction(server, library, args))
+    finally:
+        server.stop()
+
+    server = FakeSpotifyServer(library, seed=args.seed)
+    server.RequestHandlerClass = BadGatewayHandler
+    server.start()
+    try:
+        asyncio.run(check_not_idempotent(server, library))
+    finally:
+        server.stop()
+
+    server = FakeSpotifyServer(library, latency=0.2, seed=args.seed).start()
+    try:
+        asyncio.run(check_timeout(server))
+    finally:
+        server.stop()
+    print("All the checks passed", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
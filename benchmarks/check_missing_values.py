@@ -0,0 +1,79 @@
+"""
+Offline check of the analysis paths on tracks with missing values.
+
+The tracks saved before the tracks store, or imported from a Parquet/Arrow file, can have NULL parameters (NaN in a TrackTable). This
+script checks that the tempo index, the feature matrix and the statistics ignore them, and that the tempo index selects the same tracks
+as the SQLite range query. Run it from the project root with:
+    python -m benchmarks.check_missing_values
+
+"""
+
+import statistics
+import sys
+
+import datamanager
+import tracksanalyser
+from benchmarks.run_benchmarks import temporary_working_directory
+from trackrecord import TrackRecord
+
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+    print("OK: " + message, file=sys.stderr)
+
+
+def get_tracks_data():
+    return [
+        TrackRecord('a', tempo=100.0, energy=0.57),
+        TrackRecord('b', tempo=None, energy=0.73),
+        TrackRecord('c', tempo=None, energy=None),
+        TrackRecord('d', tempo=50.0, energy=0.2),
+        TrackRecord('e', tempo=200.0, energy=0.06),
+    ]
+
+
+def check_tempo_index(tracks_table):
+    tempo_index = tracksanalyser.TempoIndex(tracks_table)
+    check(list(tempo_index.query(100.0, 0.1).ids) == ['a'], "tracks without tempo not returned by the tempo index")
+    check(len(tempo_index.query(300.0, 0.1)) == 0, "no track returned for a tempo outside the dataset")
+    check(list(tempo_index.query(100.0, 0.1, include_multiples=True).ids) == ['a', 'd', 'e'], "half and double tempo tracks returned")
+
+    with temporary_working_directory():  # Same request through the SQLite BETWEEN filter.
+        data_manager = datamanager.DataManager()
+        data_manager.connect_to_database()
+        try:
+            data_manager.write_tracks_data_to_source('check', get_tracks_data())
+            database_tracks = data_manager.read_source_tracks_data_in_range('check', 'tempo', 90.0, 110.0)
+        finally:
+            data_manager.close_database()
+    check([item['id'] for item in database_tracks] == list(tempo_index.query(100.0, 0.1).ids), "same tracks as the SQLite range query")
+
+
+def check_feature_matrix(tracks_table):
+    feature_matrix = tracksanalyser.FeatureMatrix(tracks_table)
+    conditions, target = tracksanalyser.parse_feature_query('energy~0.5')
+    check(list(feature_matrix.query(conditions, target, 3).ids) == ['a', 'b', 'd'], "nearest tracks ranked on the known values")
+    check(list(feature_matrix.query(conditions, target).ids)[-1] == 'c', "track without energy ranked last")
+    conditions, target = tracksanalyser.parse_feature_query('tempo>=60')
+    check(list(feature_matrix.query(conditions, target).ids) == ['a', 'e'], "tracks without tempo left out of a range condition")
+
+
+def check_statistics(tracks_table):
+    mean_values = tracks_table.mean()
+    std_values = tracks_table.std()
+    check(mean_values['tempo'] == round((100.0 + 50.0 + 200.0) / 3, 2), "mean of the known tempos")
+    check(std_values['energy'] == round(statistics.stdev([0.57, 0.73, 0.2, 0.06]), 2), "std of the known energies")
+    check(tracksanalyser.TrackTable.from_tracks_data([TrackRecord('x', tempo=120.0)]).std()['tempo'] is None, "no std for one value")
+
+
+def main():
+    tracks_table = tracksanalyser.TrackTable.from_tracks_data(get_tracks_data())
+    check_tempo_index(tracks_table)
+    check_feature_matrix(tracks_table)
+    check_statistics(tracks_table)
+    print("All the checks passed", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Local fake of the Spotify Web API for the offline benchmarks.
+
+The server generates a synthetic library of a configurable size (tracks, albums, one playlist with all the tracks and all the tracks
+saved as liked songs) and answers the endpoints used by SpotifyAPI with the same JSON layout as Spotify. A latency and a ratio of 429
+responses can be injected to measure the rate limit and retry layer.
+
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SyntheticLibrary(object):
+    """Deterministic synthetic library of track_count tracks grouped in albums of album_size tracks."""
+
+    def __init__(self, track_count, album_size=12, seed=0):
+        rng = random.Random(seed)
+        self.track_IDs = ['%022d' % i for i in range(track_count)]
+        self.album_IDs = ['a%021d' % i for i in range((track_count + album_size - 1) // album_size)]
+        self.album_size = album_size
+        self.playlist_ID = 'p%021d' % 0
+        self.album_index = {album_ID: i for i, album_ID in enumerate(self.album_IDs)}
+        self.saved_tracks = [{'added_at': self.get_added_at(i), 'track': {'id': track_ID}} for i, track_ID in enumerate(self.track_IDs)]
+        self.saved_albums = [{'added_at': self.get_added_at(i), 'album': {'id': album_ID}} for i, album_ID in enumerate(self.album_IDs)]
+        self.playlist_tracks = [{'track': {'id': track_ID}} for track_ID in self.track_IDs]
+        self.features = dict()
+
+        for track_ID in self.track_IDs:
+            self.features[track_ID] = {
+                'danceability': round(rng.random(), 3), 'energy': round(rng.random(), 3), 'key': rng.randint(0, 11),
+                'loudness': round(rng.uniform(-30, 0), 3), 'mode': rng.randint(0, 1), 'speechiness': round(rng.random() / 2, 4),
+                'acousticness': round(rng.random(), 4), 'instrumentalness': round(rng.random(), 4), 'liveness': round(rng.random(), 4),
+                'valence': round(rng.random(), 3), 'tempo': round(rng.uniform(60, 200), 3), 'type': 'audio_features', 'id': track_ID,
+                'uri': 'spotify:track:' + track_ID, 'track_href': 'https://api.spotify.com/v1/tracks/' + track_ID,
+                'analysis_url': 'https://api.spotify.com/v1/audio-analysis/' + track_ID, 'duration_ms': rng.randint(120000, 420000),
+                'time_signature': 4,
+            }
+
+    def get_added_at(self, index):  # The newest item is the first one, like the Spotify saved items.
+        return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(1600000000 - index * 60))
+
+    def get_album_track_IDs(self, album_ID):
+        index = self.album_index.get(album_ID)
+        if index is None:
+            return None
+        return self.track_IDs[index * self.album_size:(index + 1) * self.album_size]
+
+
+class FakeSpotifyHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API.
+    disable_nagle_algorithm = True  # The headers and the body are written separately, without it every response waits for the delayed ACK.
+
+    def log_message(self, format, *args):  # No log line for each request.
+        return
+
+    def send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or dict()).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.record('bytes_sent', len(body))
+
+    def get_page(self, items, params, default_limit, path):
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', default_limit))
+        next_url = None
+        if offset + limit < len(items):
+            next_params = dict(params, offset=str(offset + limit), limit=str(limit))
+            next_url = self.server.base_url + path + '?' + urllib.parse.urlencode(next_params)
+        return {'items': items[offset:offset + limit], 'next': next_url, 'total': len(items), 'offset': offset, 'limit': limit}
+
+    def before_request(self):  # Inject the latency and the 429 responses, return False if the request is rejected.
+        self.server.record('requests', 1)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.error_rate and self.server.rng.random() < self.server.error_rate:
+            self.server.record('rate_limited', 1)
+            self.send_json(429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}}, headers={'Retry-After': '0'})
+            return False
+        return True
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def do_POST(self):
+        body = self.read_body()
+        if not self.before_request():
+            return
+        path = urllib.parse.urlparse(self.path).path
+        library = self.server.library
+
+        if path == '/api/token':
+            self.send_json(200, {'access_token': 'fake-access-token', 'refresh_token': 'fake-refresh-token', 'expires_in': 3600,
+                                 'token_type': 'Bearer'})
+        elif path.startswith('/v1/users/') and path.endswith('/playlists'):
+            self.server.record('playlists_created', 1)
+            self.send_json(201, {'id': 'new%019d' % self.server.stats['playlists_created'], 'snapshot_id': 'snapshot0'})
+        elif path.startswith('/v1/playlists/') and path.endswith('/tracks'):
+            uris = json.loads(body or b'{}').get('uris', list())
+            if len(uris) > 100:
+                self.send_json(400, {'error': {'status': 400, 'message': 'Too many ids requested'}})
+                return
+            self.server.record('tracks_added', len(uris))
+            self.send_json(201, {'snapshot_id': 'snapshot%d' % self.server.stats['tracks_added']})
+        else:
+            self.send_json(404, {'error': {'status': 404, 'message': 'Not found'}})
+
+    def do_GET(self):
+        if not self.before_request():
+            return
+        parsed_url = urllib.parse.urlparse(self.path)
+        path = parsed_url.path
+        params = dict(urllib.parse.parse_qsl(parsed_url.query))
+        library = self.server.library
+
+        if path == '/v1/me':
+            self.send_json(200, {'id': 'benchmark_user'})
+        elif path == '/v1/me/tracks':
+            self.send_json(200, self.get_page(library.saved_tracks, params, 20, path))
+        elif path == '/v1/me/albums':
+            self.send_json(200, self.get_page(library.saved_albums, params, 20, path))
+        elif path.startswith('/v1/users/') and path.endswith('/playlists'):
+            items = [{'name': 'Benchmark playlist', 'id': library.playlist_ID, 'snapshot_id': 'snapshot0'}]
+            self.send_json(200, self.get_page(items, params, 20, path))
+        elif path == '/v1/playlists/' + library.playlist_ID + '/tracks':
+            self.send_json(200, self.get_page(library.playlist_tracks, params, 100, path))
+        elif path == '/v1/albums':
+            albums = list()
+            for album_ID in params.get('ids', '').split(','):
+                track_IDs = library.get_album_track_IDs(album_ID)
+                if track_IDs is None:
+                    albums.append(None)
+                else:
+                    tracks = self.get_page([{'id': track_ID} for track_ID in track_IDs], {'limit': '50'}, 50, '/v1/albums/' + album_ID + '/tracks')
+                    albums.append({'id': album_ID, 'tracks': tracks})
+            self.send_json(200, {'albums': albums})
+        elif path.startswith('/v1/albums/') and path.endswith('/tracks'):
+            track_IDs = library.get_album_track_IDs(path.split('/')[3])
+            if track_IDs is None:
+                self.send_json(404, {'error': {'status': 404, 'message': 'Not found'}})
+            else:
+                self.send_json(200, self.get_page([{'id': track_ID} for track_ID in track_IDs], params, 20, path))
+        elif path == '/v1/audio-features':
+            track_IDs = params.get('ids', '').split(',')
+            if len(track_IDs) > 100:
+                self.send_json(400, {'error': {'status': 400, 'message': 'Too many ids requested'}})
+            else:
+                self.send_json(200, {'audio_features': [library.features.get(track_ID) for track_ID in track_IDs]})
+        elif path.startswith('/v1/audio-features/'):
+            features = library.features.get(path.split('/')[3])
+            if features is None:
+                self.send_json(404, {'error': {'status': 404, 'message': 'Not found'}})
+            else:
+                self.send_json(200, features)
+        else:
+            self.send_json(404, {'error': {'status': 404, 'message': 'Not found'}})
+
+
+class FakeSpotifyServer(ThreadingHTTPServer):
+    """Fake Spotify API server running in a background thread.
+
+    Parameters
+    ----------
+    library : SyntheticLibrary
+        library served by the fake API
+
+    latency : float
+        seconds added to every request
+
+    error_rate : float
+        ratio of the requests answered with a 429 response (Retry-After: 0)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, library, latency=0.0, error_rate=0.0, seed=0):
+        super().__init__(('127.0.0.1', 0), FakeSpotifyHandler)
+        self.library = library
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'rate_limited': 0, 'bytes_sent': 0, 'playlists_created': 0, 'tracks_added': 0}
+        self.base_url = 'http://127.0.0.1:' + str(self.server_address[1])
+        self.thread = None
+
+    @property
+    def api_url(self):
+        return self.base_url + '/v1'
+
+    @property
+    def token_url(self):
+        return self.base_url + '/api/token'
+
+    def record(self, stat, value):
+        with self.stats_lock:
+            self.stats[stat] = self.stats[stat] + value
+
+    def handle_error(self, request, client_address):  # A client that timed out closes the connection before the response.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = dict.fromkeys(self.stats, 0)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,195 @@
+"""
+Run the offline benchmarks and write the results in a JSON file.
+
+Each library size is served by a new fake Spotify server and timed on three groups of paths:
+- extraction: saved tracks, playlist tracks and saved albums IDs, then the audio features by batches,
+- database: save and load of the tracks data in a temporary SQLite database, export and load of Parquet/Arrow files (with pyarrow),
+- analysis: TrackTable build, parameter filter, tempo index, features query and stats.
+The JSON file records the commit, the Python version and the parameters so results of different versions can be compared.
+
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import datamanager
+import spotifyAPI
+import trackfiles
+import tracksanalyser
+from benchmarks.fakespotify import FakeSpotifyServer, SyntheticLibrary
+
+
+def get_commit_hash():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextlib.contextmanager
+def timer(results, name):  # Save the duration of the block in results[name], in seconds.
+    start_time = time.perf_counter()
+    yield
+    results[name] = round(time.perf_counter() - start_time, 6)
+
+
+@contextlib.contextmanager
+def temporary_working_directory():  # DataManager writes data.db and InitFiles in the working directory.
+    previous_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            yield directory
+        finally:
+            os.chdir(previous_directory)
+
+
+def create_spotify_API(server, args):
+    spotify_API = spotifyAPI.SpotifyAPI('benchmark_client', 'benchmark_secret', max_workers=args.max_workers,
+                                        requests_per_second=args.requests_per_second)
+    spotify_API.api_url = server.api_url
+    spotify_API.token_url = server.token_url
+    spotify_API.set_access_token('fake-access-token')
+    spotify_API.extract_current_user_id()
+    return spotify_API
+
+
+def benchmark_extraction(spotify_API, library, results):
+    with timer(results, 'saved_tracks_IDs_seconds'):
+        track_IDs = spotify_API.extract_saved_tracks_IDs()
+    with timer(results, 'playlist_tracks_IDs_seconds'):
+        spotify_API.extract_tracks_IDs_from_playlist(library.playlist_ID)
+    with timer(results, 'saved_albums_tracks_IDs_seconds'):
+        album_track_IDs = list(spotify_API.iter_tracks_IDs_from_saved_albums())
+    with timer(results, 'tracks_data_seconds'):
+        tracks_data = spotify_API.extract_tracks_data_in_batches(track_IDs)
+    results['extraction_seconds'] = round(results['saved_tracks_IDs_seconds'] + results['tracks_data_seconds'], 6)
+    results['tracks_per_second'] = round(len(tracks_data) / results['extraction_seconds'], 1) if results['extraction_seconds'] else None
+
+    if len(track_IDs) != len(library.track_IDs) or len(album_track_IDs) != len(library.track_IDs) or len(tracks_data) != len(track_IDs):
+        raise RuntimeError("The extraction returned an incomplete library")
+    return tracks_data
+
+
+def benchmark_database(tracks_data, results, fast_write=False):
+    with temporary_working_directory():
+        data_manager = datamanager.DataManager(fast_write=fast_write)
+        data_manager.connect_to_database()
+        try:
+            with timer(results, 'save_seconds'):
+                data_manager.write_tracks_data_to_source('benchmark', tracks_data)
+            with timer(results, 'load_seconds'):
+                loaded_tracks_data = data_manager.read_tracks_data_from_source('benchmark')
+            with timer(results, 'range_query_seconds'):
+                data_manager.read_source_tracks_data_in_range('benchmark', 'tempo', 165.0, 175.0)
+            if trackfiles.is_available():  # Optional dependency, the file benchmarks are skipped without pyarrow.
+                benchmark_files(data_manager, loaded_tracks_data, results)
+        finally:
+            data_manager.close_database()
+
+    if len(loaded_tracks_data) != len(tracks_data):
+        raise RuntimeError("The database returned " + str(len(loaded_tracks_data)) + " tracks instead of " + str(len(tracks_data)))
+
+
+def benchmark_files(data_manager, loaded_tracks_data, results):
+    tracksanalyser.get_pandas()  # Imported before the timers, the lazy import would be counted in the first DataFrame.
+    with timer(results, 'dataframe_from_database_seconds'):
+        tracksanalyser.convert_dataset_to_panda_dataframe(data_manager.read_tracks_data_from_source('benchmark'))
+    for extension in ('parquet', 'arrow'):
+        path = 'benchmark.' + extension
+        with timer(results, extension + '_export_seconds'):
+            data_manager.export_source_to_file('benchmark', path)
+        with timer(results, extension + '_track_table_seconds'):
+            tracks_table = tracksanalyser.TrackTable.from_file(path)
+        with timer(results, extension + '_dataframe_seconds'):
+            tracksanalyser.convert_dataset_to_panda_dataframe(path)
+        if len(tracks_table) != len(loaded_tracks_data):
+            raise RuntimeError("The " + extension + " file returned " + str(len(tracks_table)) + " tracks")
+
+
+def benchmark_analysis(tracks_data, results):
+    with timer(results, 'track_table_seconds'):
+        tracks_table = tracksanalyser.TrackTable.from_tracks_data(tracks_data)
+    with timer(results, 'parameter_filter_seconds'):
+        tracksanalyser.extract_track_by_parameter_and_value(tracks_table, 'tempo', 170.0, 0.05)
+    with timer(results, 'tempo_index_build_seconds'):
+        tempo_index = tracksanalyser.TempoIndex(tracks_table)
+    with timer(results, 'tempo_index_query_seconds'):
+        tempo_index.query(170.0, 0.05, include_multiples=True)
+    with timer(results, 'feature_matrix_build_seconds'):
+        feature_matrix = tracksanalyser.FeatureMatrix(tracks_table)
+    conditions, target = tracksanalyser.parse_feature_query('tempo=165±5%, energy>0.7, danceability~0.8')
+    with timer(results, 'feature_query_seconds'):
+        feature_matrix.query(conditions, target, 50)
+    with timer(results, 'stats_seconds'):
+        tracksanalyser.extract_stats_from_tracks(tracks_table)
+
+
+def benchmark_playlist_submit(spotify_API, tracks_data, results):
+    track_URIs = [track['uri'] for track in tracks_data]
+    with timer(results, 'playlist_submit_seconds'):
+        result = spotify_API.create_playlist_with_tracks('Benchmark', track_URIs)
+    if result['failed_URIs']:
+        raise RuntimeError(str(len(result['failed_URIs'])) + " tracks were not added to the playlist")
+
+
+def run_size(size, args):
+    results = {'size': size}
+    library = SyntheticLibrary(size, seed=args.seed)
+    server = FakeSpotifyServer(library, latency=args.latency, error_rate=args.error_rate, seed=args.seed).start()
+    try:
+        spotify_API = create_spotify_API(server, args)
+        server.reset_stats()
+        tracks_data = benchmark_extraction(spotify_API, library, results)
+        benchmark_playlist_submit(spotify_API, tracks_data, results)
+        results['server'] = dict(server.stats)
+    finally:
+        server.stop()
+
+    benchmark_database(tracks_data, results, fast_write=args.fast_write)
+    benchmark_analysis(tracks_data, results)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the BeatList benchmarks against a local fake Spotify API.")
+    parser.add_argument('--sizes', default='1000,10000,100000', help="comma separated library sizes (tracks)")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every fake API request")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="ratio of fake API requests answered with a 429")
+    parser.add_argument('--requests-per-second', type=float, default=1000.0, help="rate limit of the SpotifyAPI client")
+    parser.add_argument('--max-workers', type=int, default=4, help="concurrency of the SpotifyAPI client")
+    parser.add_argument('--fast-write', action='store_true', help="open the database with the WAL pragmas")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON file of the results")
+    args = parser.parse_args(argv)
+
+    report = {
+        'commit': get_commit_hash(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'parameters': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': list(),
+    }
+
+    for size in [int(size) for size in args.sizes.split(',') if size.strip()]:
+        print("Benchmark of " + str(size) + " tracks...", file=sys.stderr)
+        report['results'].append(run_size(size, args))
+
+    report_json = json.dumps(report, indent=2)
+    with open(args.output, 'w') as f:
+        f.write(report_json)
+    print("Results saved in " + args.output, file=sys.stderr)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Measure the startup time of BeatList and write the results in a JSON file.
+
+Each module is imported in a new Python process, several times, and the median wall time is kept. The cumulative import time of the
+heaviest dependencies is read from python -X importtime so a regression can be traced to the module that pulls it in. Run it from the
+project root with:
+    python -m benchmarks.startup_benchmarks --repeat 5 --output startup_results.json
+
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.run_benchmarks import get_commit_hash
+
+default_modules = ('datamanager', 'spotifyAPI', 'tracksanalyser', 'beatlistController', 'batchrunner', 'BeatList')
+
+
+def time_import(module, repeat):  # Median wall time of a new interpreter importing the module, in seconds.
+    durations = list()
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import ' + module], check=True)
+        durations.append(time.perf_counter() - start_time)
+    return statistics.median(durations)
+
+
+def read_import_times(module):  # Cumulative import time of every module imported by the module, in seconds.
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], capture_output=True, text=True, check=True).stderr
+    import_times = dict()
+    for line in output.splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        import_times[fields[2].strip()] = int(fields[1]) / 1e6  # The name is indented by its import depth.
+    return import_times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the import time of the BeatList modules.")
+    parser.add_argument('--modules', default=','.join(default_modules), help="comma separated modules to import")
+    parser.add_argument('--repeat', type=int, default=5, help="imports per module, the median is kept")
+    parser.add_argument('--top', type=int, default=10, help="number of the slowest dependencies recorded for each module")
+    parser.add_argument('--output', default='startup_results.json', help="JSON file of the results")
+    args = parser.parse_args(argv)
+
+    baseline = time_import('sys', args.repeat)  # Cost of the interpreter alone.
+    interpreter_modules = set(read_import_times('sys'))  # site, encodings, etc. are imported by every run.
+    report = {
+        'commit': get_commit_hash(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'parameters': {key: value for key, value in vars(args).items() if key != 'output'},
+        'interpreter_seconds': round(baseline, 6),
+        'results': list(),
+    }
+
+    for module in [module.strip() for module in args.modules.split(',') if module.strip()]:
+        print("Startup of " + module + "...", file=sys.stderr)
+        import_times = read_import_times(module)
+        slowest = sorted(((name, seconds) for name, seconds in import_times.items() if name != module and name not in interpreter_modules),
+                         key=lambda item: -item[1])
+        wall_time = time_import(module, args.repeat)
+        report['results'].append({
+            'module': module,
+            'wall_seconds': round(wall_time, 6),
+            'import_seconds': round(wall_time - baseline, 6),
+            'loaded_modules': len(set(import_times) - interpreter_modules),
+            'heaviest_imports': {name: round(seconds, 6) for name, seconds in slowest[:args.top]},
+        })
+
+    with open(args.output, 'w') as f:
+        f.write(json.dumps(report, indent=2))
+    print("Results saved in " + args.output, file=sys.stderr)
+    return report
+
+
+if __name__ == '__main__':
+    main()
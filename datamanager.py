@@ -5,8 +5,18 @@ This module handle all the data extraction from the local files and local databa
 
 """
 
+import itertools
+import json
+import os
 import pathlib
 import sqlite3
+import tempfile
+import threading
+import time
+
+import metrics
+import trackfiles
+from trackrecord import TrackRecord
 
 
 class DataManager(object):
@@ -15,14 +25,32 @@ class DataManager(object):
     directory_path = None
     directory_name = None
     file_path = None
+    credentials_lines = None  # In-memory copy of the creds file, read once.
+    credentials_lock = None
     conn = None
     c = None
+    features_cache_table = 'audio_features_cache'
+    features_cache_ttl = 90 * 24 * 3600  # Seconds before a cached track data is fetched again. None to keep it forever.
+    features_cache_max_size = None  # Maximum number of cached tracks. None for no limit.
+    cache_hits = 0
+    cache_misses = 0
+    tracks_data_columns = ('danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness', 'acousticness', 'instrumentalness', 'liveness', 'valence',
+                           'tempo', 'type', 'id', 'uri', 'track_href', 'analysis_url', 'duration_ms', 'time_signature')
+    write_chunk_size = 5000  # Rows given to each executemany call.
+    tracks_table = 'tracks'  # One row per track ID, shared by all the sources.
+    source_tracks_table = 'source_tracks'  # Membership of the tracks in each source (playlist, liked tracks, saved albums).
+    sync_state_table = 'sync_state'  # Playlist snapshot_id or added_at watermark of the last sync of each source.
+    fast_write = False
+    metrics = None
 
     # Constructor.
-    def __init__(self):
+    def __init__(self, fast_write=False, metrics_registry=None):
+        self.fast_write = fast_write  # Opt-in WAL journal and relaxed synchronous pragmas.
+        self.metrics = metrics_registry if metrics_registry is not None else metrics.registry
         self.directory_name = 'InitFiles'
         self.directory_path = pathlib.Path.cwd() / self.directory_name
         self.file_path = self.directory_path / 'credentials.txt'
+        self.credentials_lock = threading.Lock()  # The tokens can be saved by the token refresher thread.
 
         self.directory_path.mkdir(parents=True, exist_ok=True)  # Create path and file for credentials saving.
 
@@ -30,12 +58,23 @@ class DataManager(object):
             self.create_credentials_file()
 
         self.connect_to_database()  # Connect to SQL database and create it if necessary.
+        self.create_tracks_store()
+        self.migrate_legacy_tables()
         self.close_database()
 
     # Methods.
     def connect_to_database(self):
         self.conn = sqlite3.connect('data.db')
-        self.c = self.conn.cursor()
+        self.c = self.create_cursor()
+        if self.fast_write:
+            self.enable_fast_write_pragmas()
+
+    def create_cursor(self):  # The duration of every statement goes to the metrics.
+        return metrics.TimedCursor(self.conn.cursor(), self.metrics)
+
+    def enable_fast_write_pragmas(self):  # WAL keeps the database consistent on a crash, NORMAL only skip the fsync of each commit.
+        self.c.execute('PRAGMA journal_mode=WAL')
+        self.c.execute('PRAGMA synchronous=NORMAL')
 
     def close_database(self):
         self.c.close()
@@ -46,56 +85,44 @@ class DataManager(object):
 
         data = self.c.fetchall()
         col = 0
-        column = [element[col] for element in data]
+        internal_tables = (self.features_cache_table, self.tracks_table, self.source_tracks_table, self.sync_state_table)
+        column = [element[col] for element in data if element[col] not in internal_tables]
         return column
 
-    def create_tracks_data_table(self, table):
-        sql_query = 'CREATE TABLE IF NOT EXISTS ' + table + ' (danceability REAL, energy REAL, key REAL, loudness REAL, mode REAL, speechiness REAL, ' \
-                                                            'acousticness REAL, instrumentalness REAL, liveness REAL, valence REAL, tempo REAL, type TEXT, ' \
-                                                            'id TEXT, uri TEXT, track_href TEXT, analysis_url TEXT, duration_ms REAL, time_signature REAL)'
-
-        self.c.execute(sql_query)
-
     def read_all_tracks_data_table(self, table):
         self.conn.row_factory = sqlite3.Row
-        self.c = self.conn.cursor()
+        self.c = self.create_cursor()
         self.c.execute('SELECT * FROM ' + table)
         data = self.c.fetchall()
-        data = [dict(row) for row in data]
+        data = [TrackRecord.from_dict(row) for row in data]
         return data
 
-    def read_specific_tracks_data_table(self, param, value, tolerance):
-        param = param
-        value = value
-        lower_value = value - value * tolerance
-        upper_value = value + value * tolerance
-        sql_select = 'SELECT * FROM songData WHERE ' + param + ' >= ' + str(lower_value) + ' AND ' + param + ' <= ' + str(upper_value)
-        self.c.execute(sql_select)
+    def extract_column_names(self, table):
+        self.c.execute('SELECT name FROM pragma_table_info(?)', (table,))
+        return [row[0] for row in self.c.fetchall()]
 
-        data = self.c.fetchall()
-        return data
+    def check_table_column(self, table, column):  # Identifiers can't be bound, so they are checked against the schema instead.
+        if not self.is_table_exist(table):
+            raise ValueError("Table " + table + " does not exist")
+        if column not in self.extract_column_names(table):
+            raise ValueError("Column " + column + " does not exist in table " + table)
 
-    def write_tracks_data_to_table(self, table, data):
-        self.create_tracks_data_table(table)
-        for item in data:
-            self.c.execute(
-                'INSERT INTO ' + table + ' (danceability, energy, key, loudness, mode, speechiness, acousticness, instrumentalness, liveness, valence, tempo,'
-                ' type, id, uri, track_href, analysis_url, duration_ms, time_signature) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)',
-                (item['danceability'], item['energy'], item['key'], item['loudness'], item['mode'], item['speechiness'], item['acousticness'],
-                 item['instrumentalness'], item['liveness'], item['valence'], item['tempo'], item['type'], item['id'], item['uri'], item['track_href'],
-                 item['analysis_url'], item['duration_ms'], item['time_signature'])
-            )
-            self.conn.commit()
+    def create_index_on_column(self, table, column):
+        self.check_table_column(table, column)
+        self.c.execute('CREATE INDEX IF NOT EXISTS "idx_' + table + '_' + column + '" ON "' + table + '" ("' + column + '")')
 
-    def clear_all_data_from_table(self, table):
-        self.create_tracks_data_table(table)
-        sql = 'DELETE FROM ' + table
-        self.c.execute(sql)
-        self.conn.commit()
+    def read_tracks_data_in_range(self, table, param, lower_value, upper_value):
+        self.create_index_on_column(table, param)  # The index is created the first time a column is filtered.
+        self.conn.row_factory = sqlite3.Row
+        self.c = self.create_cursor()
+        self.c.execute('SELECT * FROM "' + table + '" WHERE "' + param + '" BETWEEN ? AND ?', (lower_value, upper_value))
+        data = self.c.fetchall()
+        data = [TrackRecord.from_dict(row) for row in data]
+        return data
 
     def is_table_exist(self, table):
-        query = 'SELECT count(*) FROM sqlite_master WHERE type=\'table\' AND name=\'' + table + '\''
-        self.c.execute(query)
+        query = 'SELECT count(*) FROM sqlite_master WHERE type=\'table\' AND name=?'
+        self.c.execute(query, (table,))
 
         # if the count is 1, then table exists
         if self.c.fetchone()[0] == 1:
@@ -113,62 +140,231 @@ class DataManager(object):
         except sqlite3.Error:
             return False
 
-    def create_credentials_file(self):  # Create the creds file with defaults values.
-        file_object = open(self.file_path, mode='w')
-        file_object.writelines('CLIENT_ID_ACQUIRED\n')
-        file_object.writelines('CLIENT_ID\n')
-        file_object.writelines('CLIENT_SECRET\n')
-        file_object.writelines('AUTH_GRANT\n')
-        file_object.writelines('ACCESS_TOKEN\n')
-        file_object.writelines('REFRESH_TOKEN\n')
-        file_object.close()
+    def create_tracks_store(self):
+        columns = ', '.join(column + (' TEXT' if column in ('type', 'uri', 'track_href', 'analysis_url') else ' REAL')
+                            for column in self.tracks_data_columns if column != 'id')
+        self.c.execute('CREATE TABLE IF NOT EXISTS ' + self.tracks_table + ' (id TEXT PRIMARY KEY, ' + columns + ')')
+        self.c.execute('CREATE TABLE IF NOT EXISTS ' + self.source_tracks_table + ' (source TEXT, position INTEGER, track_id TEXT, PRIMARY KEY (source, position))')
+        self.c.execute('CREATE INDEX IF NOT EXISTS idx_' + self.source_tracks_table + '_track_id ON ' + self.source_tracks_table + ' (track_id)')
+        self.c.execute('CREATE TABLE IF NOT EXISTS ' + self.sync_state_table + ' (source TEXT PRIMARY KEY, snapshot_id TEXT, watermark TEXT)')
+
+    def read_sync_state(self, source):  # Return [snapshot_id, watermark] of the last sync, None for the unknown values.
+        self.c.execute('SELECT snapshot_id, watermark FROM ' + self.sync_state_table + ' WHERE source = ?', (source,))
+        row = self.c.fetchone()
+        if row is None:
+            return [None, None]
+        return [row[0], row[1]]
+
+    def save_sync_state(self, source, snapshot_ID=None, watermark=None):
+        with self.conn:
+            self.c.execute('INSERT OR REPLACE INTO ' + self.sync_state_table + ' (source, snapshot_id, watermark) VALUES (?,?,?)',
+                           (source, snapshot_ID, watermark))
+
+    def write_tracks_data_to_source(self, source, data, replace=False):  # Only the new tracks are added to the tracks table.
+        sql_insert = 'INSERT OR IGNORE INTO ' + self.tracks_table + ' (' + ', '.join(self.tracks_data_columns) + ') VALUES (' + \
+                     ','.join('?' * len(self.tracks_data_columns)) + ')'
+        data = iter(data)
+
+        with self.conn:  # One transaction for the whole save, an interrupted save leaves the source as it was.
+            if replace:  # The sync state described the replaced tracks, the caller saves the new one after the write.
+                self.c.execute('DELETE FROM ' + self.source_tracks_table + ' WHERE source = ?', (source,))
+                self.c.execute('DELETE FROM ' + self.sync_state_table + ' WHERE source = ?', (source,))
+            self.c.execute('SELECT COALESCE(MAX(position) + 1, 0) FROM ' + self.source_tracks_table + ' WHERE source = ?', (source,))
+            position = self.c.fetchone()[0]
+            chunk = list(itertools.islice(data, self.write_chunk_size))
+            while chunk:
+                self.c.executemany(sql_insert, (tuple(item[column] for column in self.tracks_data_columns) for item in chunk))
+                self.c.executemany('INSERT INTO ' + self.source_tracks_table + ' (source, position, track_id) VALUES (?,?,?)',
+                                   ((source, position + i, item['id']) for i, item in enumerate(chunk)))
+                position = position + len(chunk)
+                chunk = list(itertools.islice(data, self.write_chunk_size))
+
+    def read_tracks_data_from_source(self, source=None):  # All the tracks of the store when source is None.
+        self.conn.row_factory = sqlite3.Row
+        self.c = self.create_cursor()
+        if source is None:
+            self.c.execute('SELECT * FROM ' + self.tracks_table)
+        else:
+            self.c.execute('SELECT t.* FROM ' + self.source_tracks_table + ' s JOIN ' + self.tracks_table + ' t ON t.id = s.track_id '
+                           'WHERE s.source = ? ORDER BY s.position', (source,))
+        data = self.c.fetchall()
+        data = [TrackRecord.from_dict(row) for row in data]
+        return data
 
-    def save_line_info(self, line_data, line_number):  # Save info in one particuliar line in the creds file.
-        file_path = self.file_path
-
-        if file_path.is_file():
-            with open(file_path, 'r') as f:
-                try:
-                    fline = f.readlines()
-                    fline[line_number] = line_data + "\n"
-                    f.close()
-                except IndexError:
-                    print("No data found")
-            with open(file_path, 'w') as f:
-                try:
-                    for line in fline:
-                        f.write(line)
-                    f.close()
-                    return True
-                except IndexError:
-                    print("No data found")
-            return False
+    def iter_tracks_data_from_source(self, source=None, batch_size=1000):  # Yield the tracks by batches, the source is never fully loaded.
+        cursor = self.create_cursor()  # Own cursor, the other methods can be called while the batches are read.
+        if source is None:
+            cursor.execute('SELECT * FROM ' + self.tracks_table)
         else:
+            cursor.execute('SELECT t.* FROM ' + self.source_tracks_table + ' s JOIN ' + self.tracks_table + ' t ON t.id = s.track_id '
+                           'WHERE s.source = ? ORDER BY s.position', (source,))
+        column_names = [column[0] for column in cursor.description]
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            yield [TrackRecord.from_dict(dict(zip(column_names, row))) for row in rows]
+            rows = cursor.fetchmany(batch_size)
+        cursor.close()
+
+    def export_source_to_file(self, source, path, batch_size=10000):  # Parquet or Arrow file by extension, all the tracks when source is None.
+        selected_columns = ', '.join('t.' + column for column in trackfiles.columns)
+        cursor = self.create_cursor()
+        if source is None:
+            cursor.execute('SELECT ' + selected_columns + ' FROM ' + self.tracks_table + ' t')
+        else:
+            cursor.execute('SELECT ' + selected_columns + ' FROM ' + self.source_tracks_table + ' s JOIN ' + self.tracks_table + ' t '
+                           'ON t.id = s.track_id WHERE s.source = ? ORDER BY s.position', (source,))
+        try:
+            return trackfiles.write_rows(path, iter(lambda: cursor.fetchmany(batch_size), []))
+        finally:
+            cursor.close()
+
+    def import_source_from_file(self, path, source, replace=True):  # One transaction, a replaced source loses its sync state too.
+        self.write_tracks_data_to_source(source, trackfiles.iter_track_records(path), replace=replace)
+        return self.count_source_tracks(source)
+
+    def read_source_tracks_data_in_range(self, source, param, lower_value, upper_value):  # Search all the sources when source is None.
+        if source is None:
+            return self.read_tracks_data_in_range(self.tracks_table, param, lower_value, upper_value)
+
+        self.create_index_on_column(self.tracks_table, param)
+        self.conn.row_factory = sqlite3.Row
+        self.c = self.create_cursor()
+        self.c.execute('SELECT t.* FROM ' + self.source_tracks_table + ' s JOIN ' + self.tracks_table + ' t ON t.id = s.track_id '
+                       'WHERE s.source = ? AND t."' + param + '" BETWEEN ? AND ? ORDER BY s.position', (source, lower_value, upper_value))
+        data = self.c.fetchall()
+        data = [TrackRecord.from_dict(row) for row in data]
+        return data
+
+    def extract_all_source_name(self):
+        self.c.execute('SELECT DISTINCT source FROM ' + self.source_tracks_table + ' ORDER BY source')
+        return [row[0] for row in self.c.fetchall()]
+
+    def count_source_tracks(self, source):
+        self.c.execute('SELECT count(*) FROM ' + self.source_tracks_table + ' WHERE source = ?', (source,))
+        return self.c.fetchone()[0]
+
+    def is_source_exist(self, source):
+        return self.count_source_tracks(source) > 0
+
+    def drop_source(self, source):  # The tracks that are not in any other source are deleted too.
+        try:
+            with self.conn:
+                self.c.execute('DELETE FROM ' + self.source_tracks_table + ' WHERE source = ?', (source,))
+                self.c.execute('DELETE FROM ' + self.sync_state_table + ' WHERE source = ?', (source,))
+                self.c.execute('DELETE FROM ' + self.tracks_table + ' WHERE id NOT IN (SELECT track_id FROM ' + self.source_tracks_table + ')')
+            return True
+        except sqlite3.Error:
             return False
 
-    def extract_line_info(self, line_number):  # Extract one particuliar line in the creds files.
-        file_path = self.file_path
-
-        if file_path.is_file():
-            with open(file_path, 'r') as f:
-                try:
-                    return f.readlines()[line_number].rstrip()
-                except IndexError:
-                    print("No data found")
+    def migrate_legacy_tables(self):  # Move the tables of the old one table per source layout into the tracks store.
+        for table in self.extract_all_table_name():
+            if set(self.extract_column_names(table)) == set(self.tracks_data_columns):
+                self.write_tracks_data_to_source(table, self.read_all_tracks_data_table(table), replace=True)  # An interrupted migration is done again.
+                self.drop_table(table)
+
+    def create_features_cache_table(self):
+        self.c.execute('CREATE TABLE IF NOT EXISTS ' + self.features_cache_table + ' (id TEXT PRIMARY KEY, data TEXT, fetched_at REAL)')
+        self.c.execute('CREATE INDEX IF NOT EXISTS idx_' + self.features_cache_table + '_fetched_at ON ' + self.features_cache_table + ' (fetched_at)')
+
+    def read_cached_tracks_data(self, track_IDs_list):  # Return the cached tracks data by track ID, only for the IDs found in the cache.
+        self.create_features_cache_table()
+        min_fetched_at = time.time() - self.features_cache_ttl if self.features_cache_ttl is not None else 0
+        cached_data = dict()
+
+        chunk_size = 500  # Stay under the SQLite limit of bound parameters.
+        for i in range(0, len(track_IDs_list), chunk_size):
+            chunk = track_IDs_list[i:i + chunk_size]
+            query = 'SELECT id, data FROM ' + self.features_cache_table + ' WHERE fetched_at >= ? AND id IN (' + ','.join('?' * len(chunk)) + ')'
+            self.c.execute(query, [min_fetched_at] + list(chunk))
+            for row in self.c.fetchall():
+                cached_data[row[0]] = TrackRecord.from_dict(json.loads(row[1]))
+
+        hits = sum(1 for track_ID in track_IDs_list if track_ID in cached_data)
+        self.cache_hits = self.cache_hits + hits
+        self.cache_misses = self.cache_misses + len(track_IDs_list) - hits
+        self.metrics.increment('features_cache_hits_total', hits)
+        self.metrics.increment('features_cache_misses_total', len(track_IDs_list) - hits)
+        return cached_data
+
+    def write_tracks_data_to_cache(self, tracks_data):
+        self.create_features_cache_table()
+        fetched_at = time.time()
+        with self.conn:
+            self.c.executemany('INSERT OR REPLACE INTO ' + self.features_cache_table + ' (id, data, fetched_at) VALUES (?,?,?)',
+                               ((item['id'], json.dumps(TrackRecord.from_dict(item).as_compact_dict()), fetched_at) for item in tracks_data))
+        self.evict_features_cache()
+
+    def evict_features_cache(self):  # Remove the expired tracks, then the oldest ones if the cache is over its maximum size.
+        with self.conn:
+            if self.features_cache_ttl is not None:
+                self.c.execute('DELETE FROM ' + self.features_cache_table + ' WHERE fetched_at < ?', (time.time() - self.features_cache_ttl,))
+            if self.features_cache_max_size is not None:
+                self.c.execute('DELETE FROM ' + self.features_cache_table + ' WHERE id IN (SELECT id FROM ' + self.features_cache_table +
+                               ' ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)', (self.features_cache_max_size,))
+
+    def get_cache_hit_rate(self):
+        requested = self.cache_hits + self.cache_misses
+        if requested == 0:
+            return 0.0
+        return self.cache_hits / requested
+
+    def create_credentials_file(self):  # Create the creds file with defaults values.
+        self.credentials_lines = ['CLIENT_ID_ACQUIRED', 'CLIENT_ID', 'CLIENT_SECRET', 'AUTH_GRANT', 'ACCESS_TOKEN', 'REFRESH_TOKEN']
+        self.write_credentials_file()
+
+    def read_credentials_file(self):  # The file is only read the first time a line is requested.
+        if self.credentials_lines is None:
+            with open(self.file_path, 'r') as f:
+                self.credentials_lines = [line.rstrip() for line in f.readlines()]
+        return self.credentials_lines
+
+    def write_credentials_file(self):  # Atomic write: the file is replaced by a complete temporary file, never left half written.
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory_path, prefix='.credentials_', suffix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'w') as f:
+                f.writelines(line + '\n' for line in self.credentials_lines)
+            os.replace(temporary_path, self.file_path)
+        except OSError:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+    def save_lines_info(self, lines_data):  # Save several lines of the creds file with one write, lines_data: dict of line number -> info.
+        if not self.file_path.is_file():
             return False
-        else:
+
+        with self.credentials_lock:
+            lines = self.read_credentials_file()
+            if max(lines_data) >= len(lines):
+                print("No data found")
+                return False
+            for line_number, line_data in lines_data.items():
+                lines[line_number] = line_data
+            self.write_credentials_file()
+        return True
+
+    def save_line_info(self, line_data, line_number):  # Save info in one particuliar line in the creds file.
+        return self.save_lines_info({line_number: line_data})
+
+    def extract_line_info(self, line_number):  # Extract one particuliar line in the creds files.
+        if not self.file_path.is_file():
             return "file don't exist"
 
+        with self.credentials_lock:
+            try:
+                return self.read_credentials_file()[line_number]
+            except IndexError:
+                print("No data found")
+        return False
+
     def save_authentification_to_file(self, authentification):
         self.save_line_info(authentification, 3)
 
     def save_tokens_to_file(self, access_token, refresh_token):
-        self.save_line_info(access_token, 4)
-        self.save_line_info(refresh_token, 5)
+        self.save_lines_info({4: access_token, 5: refresh_token})
 
     def save_client_info_to_file(self, client_id, client_secret):
-        self.save_line_info(client_id, 1)
-        self.save_line_info(client_secret, 2)
+        self.save_lines_info({1: client_id, 2: client_secret})
 
     def extract_token_from_file(self):
         access_token = self.extract_line_info(4)
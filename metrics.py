@@ -0,0 +1,175 @@
+"""
+Module for the run metrics.
+
+This module provides the counters and latency histograms filled by SpotifyAPI (requests per endpoint, 429, retries, bytes) and by
+DataManager (SQLite statement timings, audio features cache hits). The metrics can be dumped at the end of a run as JSON or as
+Prometheus text to see where a slow extraction spent its time.
+
+"""
+
+import bisect
+import contextlib
+import json
+import re
+import threading
+import time
+import urllib.parse
+
+_SQL_TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE(?:\s+IF\s+NOT\s+EXISTS)?|ON)\s+"?(\w+)"?', re.IGNORECASE)
+_API_PATH_WORDS = {'v1', 'api', 'token', 'me', 'tracks', 'albums', 'playlists', 'users', 'audio-features'}
+
+
+def get_endpoint(query):
+    """Return the path of a Spotify URL with the IDs replaced by {id}, e.g. /v1/playlists/{id}/tracks."""
+    path = urllib.parse.urlparse(query).path
+    return '/'.join(part if part in _API_PATH_WORDS or not part else '{id}' for part in path.split('/'))
+
+
+def get_statement_label(sql):
+    """Return the operation and the first table of a SQL statement, e.g. ('SELECT', 'tracks')."""
+    words = sql.split(None, 1)
+    operation = words[0].upper() if words else ''
+    match = _SQL_TABLE_PATTERN.search(sql)
+    return operation, match.group(1) if match else ''
+
+
+class Histogram(object):
+    """Cumulative histogram with fixed buckets, like the Prometheus histograms."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # The last bucket is +Inf.
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count = self.count + 1
+        self.sum = self.sum + value
+
+    def get_cumulative_counts(self):
+        counts = list()
+        total = 0
+        for bucket_count in self.bucket_counts:
+            total = total + bucket_count
+            counts.append(total)
+        return counts
+
+    def as_dict(self):
+        bounds = [str(bucket) for bucket in self.buckets] + ['+Inf']
+        return {'count': self.count, 'sum': round(self.sum, 6), 'buckets': dict(zip(bounds, self.get_cumulative_counts()))}
+
+
+class MetricsRegistry(object):
+    """Thread-safe store of the counters and histograms of one run.
+
+    The metrics are identified by a name and a dict of labels, e.g. ('spotify_requests_total', {'endpoint': '/v1/me', 'status': '200'}).
+    """
+
+    default_buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Seconds.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = dict()
+        self.histograms = dict()
+
+    def reset(self):
+        with self.lock:
+            self.counters = dict()
+            self.histograms = dict()
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(self.default_buckets)
+            self.histograms[key].observe(value)
+
+    @contextlib.contextmanager
+    def time(self, name, **labels):  # Observe the duration of the block, in seconds.
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def get_counter(self, name, **labels):
+        with self.lock:
+            if labels:
+                return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+            return sum(value for (counter_name, _), value in self.counters.items() if counter_name == name)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in sorted(self.counters.items())],
+                'histograms': [dict(name=name, labels=dict(labels), **histogram.as_dict())
+                               for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0])],
+            }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join(key + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"' for key, value in pairs) + '}'
+
+        lines = list()
+        typed_names = set()
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed_names:
+                    lines.append('# TYPE ' + name + ' counter')
+                    typed_names.add(name)
+                lines.append(name + format_labels(labels) + ' ' + str(value))
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                if name not in typed_names:
+                    lines.append('# TYPE ' + name + ' histogram')
+                    typed_names.add(name)
+                bounds = [str(bucket) for bucket in histogram.buckets] + ['+Inf']
+                for bound, count in zip(bounds, histogram.get_cumulative_counts()):
+                    lines.append(name + '_bucket' + format_labels(labels, [('le', bound)]) + ' ' + str(count))
+                lines.append(name + '_sum' + format_labels(labels) + ' ' + repr(histogram.sum))
+                lines.append(name + '_count' + format_labels(labels) + ' ' + str(histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def save(self, path):  # Prometheus text for a .prom file, JSON otherwise.
+        text = self.to_prometheus() if str(path).endswith('.prom') else self.to_json()
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+class TimedCursor(object):
+    """sqlite3 cursor wrapper that observes the duration of each statement in a MetricsRegistry."""
+
+    def __init__(self, cursor, registry):
+        self.cursor = cursor
+        self.registry = registry
+
+    def execute(self, sql, parameters=()):
+        operation, table = get_statement_label(sql)
+        with self.registry.time('sqlite_statement_seconds', operation=operation, table=table):
+            return self.cursor.execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        operation, table = get_statement_label(sql)
+        with self.registry.time('sqlite_statement_seconds', operation=operation, table=table):
+            return self.cursor.executemany(sql, seq_of_parameters)
+
+    def __getattr__(self, name):  # fetchall, fetchone, close, etc. go to the cursor.
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+
+registry = MetricsRegistry()  # Shared by the SpotifyAPI and DataManager objects that do not receive their own registry.
@@ -0,0 +1,179 @@
+"""
+Streaming pipeline for the playlist generation.
+
+The stages of the generation run at the same time and are connected by bounded queues:
+    1. the track IDs are read page by page from Spotify,
+    2. the audio features are fetched by batches of 100 IDs,
+    3. the tracks are filtered (tempo, features query, etc.),
+    4. the matching tracks are added to the playlist by batches of 100 URIs.
+The first matching tracks land in the playlist while the rest of the library is still being extracted, and the bounded queues keep the
+memory constant whatever the library size.
+
+"""
+
+import itertools
+import queue
+import threading
+
+import requests
+
+_END_OF_STREAM = None  # Put in a queue when the previous stage has no more items.
+
+
+class StreamingPipeline(object):
+    """Generator-based playlist generation pipeline.
+
+    Parameters
+    ----------
+    spotify_API : spotifyAPI.SpotifyAPI
+        authenticated Spotify API object
+
+    track_IDs : iterable(str)
+        track IDs of the source, usually one of the SpotifyAPI iter_* generators
+
+    track_filter : callable
+        receive a list of TrackRecord and return the URIs of the tracks to add to the playlist
+
+    playlist_ID : str
+        ID of the playlist that receive the tracks
+
+    cache : datamanager.DataManager, optional
+        connected DataManager used as audio features cache, it is only used by the thread calling run()
+
+    queue_size : int
+        maximum number of batches waiting between two stages
+    """
+
+    stage_names = ('track_IDs', 'tracks_data', 'track_URIs')  # Name of the queue at the input of the features, filter and add stages.
+
+    def __init__(self, spotify_API, track_IDs, track_filter, playlist_ID, cache=None, queue_size=4):
+        self.spotify_API = spotify_API
+        self.track_IDs = track_IDs
+        self.track_filter = track_filter
+        self.playlist_ID = playlist_ID
+        self.cache = cache
+        self.queues = {name: queue.Queue(maxsize=queue_size) for name in self.stage_names}
+        self.stop_event = threading.Event()
+        self.errors = list()
+        self.counters = {
+            'track_IDs_read': 0,
+            'tracks_data_fetched': 0,
+            'tracks_matched': 0,
+            'tracks_added': 0,
+            'failed_batches': 0,
+        }
+        self.counters_lock = threading.Lock()
+        self.added_URIs = list()
+
+    def increment(self, counter, value):
+        with self.counters_lock:
+            self.counters[counter] = self.counters[counter] + value
+
+    def get_queue_depths(self):  # Batches waiting at the input of each stage, a full queue is after the stage that stall.
+        return {name: stage_queue.qsize() for name, stage_queue in self.queues.items()}
+
+    def get_status(self):
+        status = ', '.join(name + ': ' + str(value) for name, value in self.counters.items())
+        depths = ', '.join(name + ': ' + str(depth) for name, depth in self.get_queue_depths().items())
+        return status + ' | queue depths ' + depths
+
+    def put(self, name, item):  # Blocking put that gives up when the pipeline is stopped.
+        while not self.stop_event.is_set():
+            try:
+                self.queues[name].put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, name):
+        while not self.stop_event.is_set():
+            try:
+                return self.queues[name].get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END_OF_STREAM
+
+    def read_track_IDs_stage(self):
+        try:
+            track_IDs = iter(self.track_IDs)
+            batch = list(itertools.islice(track_IDs, 100))
+            while batch:
+                self.increment('track_IDs_read', len(batch))
+                if not self.put('track_IDs', batch):
+                    return
+                batch = list(itertools.islice(track_IDs, 100))
+        except Exception as e:
+            self.errors.append(e)
+            self.stop_event.set()
+        finally:
+            self.put('track_IDs', _END_OF_STREAM)
+
+    def filter_stage(self):
+        try:
+            pending_URIs = list()
+            tracks_data = self.get('tracks_data')
+            while tracks_data is not _END_OF_STREAM:
+                pending_URIs.extend(self.track_filter(tracks_data))
+                while len(pending_URIs) >= 100:  # The API accepts at most 100 URIs per request.
+                    self.increment('tracks_matched', 100)
+                    self.put('track_URIs', pending_URIs[:100])
+                    pending_URIs = pending_URIs[100:]
+                tracks_data = self.get('tracks_data')
+            if pending_URIs:
+                self.increment('tracks_matched', len(pending_URIs))
+                self.put('track_URIs', pending_URIs)
+        except Exception as e:
+            self.errors.append(e)
+            self.stop_event.set()
+        finally:
+            self.put('track_URIs', _END_OF_STREAM)
+
+    def add_tracks_stage(self):
+        track_URIs = self.get('track_URIs')
+        while track_URIs is not _END_OF_STREAM:
+            if self.spotify_API.add_tracks_to_a_playlist(self.playlist_ID, track_URIs):
+                self.increment('tracks_added', len(track_URIs))
+                self.added_URIs.extend(track_URIs)
+            else:
+                self.increment('failed_batches', 1)
+            track_URIs = self.get('track_URIs')
+
+    def run(self):
+        """Run the pipeline until the source is exhausted and return the URIs added to the playlist.
+
+        The features stage runs in the calling thread so the SQLite cache connection is used by the thread that created it.
+        """
+        threads = [
+            threading.Thread(target=self.read_track_IDs_stage, daemon=True),
+            threading.Thread(target=self.filter_stage, daemon=True),
+            threading.Thread(target=self.add_tracks_stage, daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        sess = self.spotify_API.get_GET_session()
+        try:
+            track_IDs_batch = self.get('track_IDs')
+            while track_IDs_batch is not _END_OF_STREAM:
+                try:
+                    tracks_data = self.spotify_API.extract_tracks_data_of_one_batch(sess, track_IDs_batch, cache=self.cache)
+                except requests.exceptions.RequestException:
+                    self.increment('failed_batches', 1)
+                else:
+                    self.increment('tracks_data_fetched', len(tracks_data))
+                    self.put('tracks_data', tracks_data)
+                print(self.get_status(), end='\r')
+                track_IDs_batch = self.get('track_IDs')
+        except BaseException:
+            self.stop_event.set()
+            raise
+        finally:
+            self.put('tracks_data', _END_OF_STREAM)
+            for thread in threads:
+                thread.join()
+
+        if self.errors:
+            raise self.errors[0]
+
+        return self.added_URIs
@@ -9,10 +9,21 @@ This module handle all the GET and POST request associated with the Spotify API.
 
 import base64
 import datetime
+import email.utils
+import math
 import requests
+import requests.adapters
+import urllib3.exceptions
 from requests.auth import HTTPBasicAuth
 import urllib.parse
 import time
+import itertools
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from trackrecord import TrackRecord
 
 
 class BasicAuth(requests.auth.AuthBase):
@@ -36,6 +47,29 @@ class BasicAuth(requests.auth.AuthBase):
         return client_cred_b64.decode()
 
 
+class RateLimiter(object):
+    """Token bucket shared by every thread doing requests with the same SpotifyAPI object."""
+
+    def __init__(self, rate=10.0, capacity=10):
+        self.rate = rate  # Tokens added per second.
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_update = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):  # Block until one request can be sent.
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_update) * self.rate)
+                self.last_update = now
+                if self.tokens >= 1:
+                    self.tokens = self.tokens - 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
 class SpotifyAPI(object):
 
     # Variables.
@@ -54,11 +88,36 @@ class SpotifyAPI(object):
     api_url = 'https://api.spotify.com/v1'
     bearer_auth = None
     basic_auth = None
-
-    def __init__(self, client_id, client_secret):
+    rate_limiter = None
+    max_workers = 1
+    max_retry = 5
+    backoff_base = 0.5  # Seconds.
+    backoff_max = 30.0  # Seconds.
+    session = None
+    session_lock = None
+    token_lock = None
+    token_callback = None  # Called with (access_token, refresh_token) each time new tokens are received, to save them.
+    token_refresher = None
+    token_refresher_stop = None
+    token_refresh_margin = 300  # Seconds before the expiry when the background refresher renews the access token.
+    token_refresh_retry_delay = 30  # Seconds between two attempts of the background refresher after a failure.
+    metrics = None
+    failed_extractions = 0  # Pages and batches skipped because of an error, an incomplete extraction must not be saved as a sync.
+    failed_extractions_lock = None
+
+    def __init__(self, client_id, client_secret, max_workers=1, requests_per_second=10.0, max_retry=5, pool_size=10, keep_alive=True,
+                 metrics_registry=None):
         self.client_id = client_id
         self.client_secret = client_secret
         self.basic_auth = BasicAuth(self.client_id, self.client_secret)
+        self.max_workers = max_workers  # Concurrency limit for the parallel extraction modes.
+        self.max_retry = max_retry  # Retry budget of each request on 429, 5xx and connection errors.
+        self.rate_limiter = RateLimiter(rate=requests_per_second, capacity=max(1, int(requests_per_second)))
+        self.session_lock = threading.Lock()
+        self.token_lock = threading.RLock()  # Only one refresh at a time, the token endpoint is called from send_request.
+        self.session = self.create_session(max(pool_size, max_workers), keep_alive)  # One pool of connections for the whole run.
+        self.metrics = metrics_registry if metrics_registry is not None else metrics.registry
+        self.failed_extractions_lock = threading.Lock()
 
     def get_redirect_uri_encoded(self):
         redirect_uri = self.redirect_uri
@@ -84,19 +143,108 @@ class SpotifyAPI(object):
         }
         return token_data
 
-    def get_GET_session(self):
+    def create_session(self, pool_size, keep_alive):
         sess = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        sess.mount('https://', adapter)
+        sess.mount('http://', adapter)
+        if not keep_alive:
+            sess.headers['Connection'] = 'close'
         sess.headers['Authorization'] = 'Bearer ' f'{self.access_token}'
 
         return sess
 
+    def update_session_authorization(self):  # Called each time the access token change, the pooled connections are kept.
+        with self.session_lock:
+            self.session.headers['Authorization'] = 'Bearer ' f'{self.access_token}'
+
+    def get_GET_session(self):
+        return self.session
+
     def get_POST_session(self):
+        return self.session  # requests set the JSON Content-Type header when the json argument is used.
 
-        sess = requests.Session()
-        sess.headers['Authorization'] = 'Bearer ' f'{self.access_token}'
-        sess.headers['Content-Type'] = 'application/json'
+    def get_backoff_time(self, attempt):  # Exponential backoff with full jitter.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
 
-        return sess
+    def get_retry_after_time(self, retry_after):  # Seconds to wait from a Retry-After header (seconds or HTTP-date), None if invalid.
+        if retry_after is None:
+            return None
+        try:
+            seconds = float(retry_after)
+        except ValueError:
+            pass
+        else:
+            return max(0.0, seconds) if math.isfinite(seconds) else None
+        try:
+            retry_date = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError, IndexError):
+            return None
+        if retry_date.tzinfo is None:  # An HTTP-date is always in GMT.
+            retry_date = retry_date.replace(tzinfo=datetime.timezone.utc)
+        return max(0.0, (retry_date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+    def send_request(self, method, query, sess=None, idempotent=True, **kwargs):  # Every request to Spotify goes through this method.
+        sent_access_token = self.access_token
+        try:
+            return self.send_request_with_retry(method, query, sess=sess, idempotent=idempotent, **kwargs)
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code != 401 or query == self.token_url or not self.refresh_token:
+                raise
+            self.metrics.increment('spotify_unauthorized_total', endpoint=metrics.get_endpoint(query))
+            if not self.refresh_expired_access_token(sent_access_token):
+                raise
+        return self.send_request_with_retry(method, query, sess=sess, idempotent=idempotent, **kwargs)  # The 401 is retried once with the new token.
+
+    def is_connect_error(self, error):  # True if the connection failed before anything was sent to Spotify.
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], 'reason', None) if error.args else None  # requests wraps the urllib3 MaxRetryError.
+        return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+    def send_request_with_retry(self, method, query, sess=None, idempotent=True, **kwargs):
+        # A request that is not idempotent (playlist creation, tracks add) is only retried when Spotify did not process it: on a 429 or
+        # when the connection failed. A 5xx, a timeout or a dropped connection can come after the request was applied.
+        send = sess.request if sess is not None else requests.request
+        endpoint = metrics.get_endpoint(query)
+
+        for attempt in range(self.max_retry + 1):
+            if attempt > 0:
+                self.metrics.increment('spotify_retries_total', endpoint=endpoint, method=method)
+            with self.metrics.time('spotify_rate_limit_wait_seconds'):
+                self.rate_limiter.acquire()
+            start_time = time.perf_counter()
+            try:
+                response = send(method, query, **kwargs)
+                self.record_response(endpoint, method, response, time.perf_counter() - start_time)
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                status_code = e.response.status_code
+                if attempt == self.max_retry or (status_code != 429 and (status_code < 500 or not idempotent)):
+                    raise
+                retry_after = self.get_retry_after_time(e.response.headers.get('retry-after')) if status_code == 429 else None
+                wait_time = retry_after if retry_after is not None else self.get_backoff_time(attempt)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.metrics.increment('spotify_requests_total', endpoint=endpoint, method=method, status='connection_error')
+                if attempt == self.max_retry or (not idempotent and not self.is_connect_error(e)):
+                    raise
+                wait_time = self.get_backoff_time(attempt)
+            else:
+                return response
+            self.metrics.observe('spotify_backoff_seconds', wait_time, endpoint=endpoint)
+            time.sleep(wait_time)
+
+    def record_response(self, endpoint, method, response, elapsed):
+        self.metrics.increment('spotify_requests_total', endpoint=endpoint, method=method, status=str(response.status_code))
+        self.metrics.observe('spotify_request_seconds', elapsed, endpoint=endpoint, method=method)
+        self.metrics.increment('spotify_response_bytes_total', len(response.content), endpoint=endpoint)
+        if response.request is not None and response.request.body:
+            self.metrics.increment('spotify_request_bytes_total', len(response.request.body), endpoint=endpoint)
+        if response.status_code == 429:
+            self.metrics.increment('spotify_rate_limited_total', endpoint=endpoint)
+
+    def get_json(self, sess, query, params=None):
+        return self.send_request('GET', query, sess=sess, params=params).json()
 
     def extract_access_token(self):
         token_url = self.token_url
@@ -104,19 +252,21 @@ class SpotifyAPI(object):
         output = [False, '', '']
 
         try:
-            response = requests.post(token_url, auth=self.basic_auth, data=token_data)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
+            response = self.send_request('POST', token_url, sess=self.session, auth=self.basic_auth, data=token_data)
+        except requests.exceptions.RequestException as e:
             print(e)
         else:
             token_response_data = response.json()
             self.now = datetime.datetime.now()
             self.access_token = token_response_data['access_token']
             self.refresh_token = token_response_data['refresh_token']
+            self.update_session_authorization()
             output = [True, self.access_token, self.refresh_token]
             expires_in = token_response_data['expires_in']
             self.expires = self.now + datetime.timedelta(seconds=expires_in)
             print("\nToken expires at: " + self.expires.strftime("%H:%M:%S"))
+            if self.token_callback is not None:
+                self.token_callback(self.access_token, self.refresh_token)
         finally:
             return output
 
@@ -126,12 +276,10 @@ class SpotifyAPI(object):
         sess = self.get_GET_session()
 
         try:
-            response = sess.get(query)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
+            response_json = self.get_json(sess, query)
+        except requests.exceptions.RequestException as e:
             print(e)
         else:
-            response_json = response.json()
             self.user_id = response_json['id']
         finally:
             return self.user_id
@@ -144,6 +292,7 @@ class SpotifyAPI(object):
 
     def set_access_token(self, access_token):
         self.access_token = access_token
+        self.update_session_authorization()
 
     def get_refresh_token(self):
         return self.refresh_token
@@ -151,6 +300,9 @@ class SpotifyAPI(object):
     def set_refresh_token(self, refresh_token):
         self.refresh_token = refresh_token
 
+    def set_token_callback(self, token_callback):
+        self.token_callback = token_callback
+
     def get_expires(self):
         return self.expires
 
@@ -165,139 +317,214 @@ class SpotifyAPI(object):
         print("---  " + full_auth_url + "  ---")
         self.auth_code = input("code: ")
 
-    def refresh(self):
+    def refresh(self, verbose=True):  # Return the new access token, or an empty string if the refresh failed.
         token_url = self.token_url
-        refresh_token_data = self.get_refresh_token_data()
 
-        try:
-            response = requests.post(token_url, auth=self.basic_auth, data=refresh_token_data)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            self.access_token = ''
-            print(e)
-        else:
+        with self.token_lock:
+            refresh_token_data = self.get_refresh_token_data()
+            try:
+                response = self.send_request('POST', token_url, sess=self.session, auth=self.basic_auth, data=refresh_token_data)
+            except requests.exceptions.RequestException as e:
+                print(e)
+                return ''  # The current token is kept, the requests already sent with it are not broken.
+
             token_response_data = response.json()
             self.now = datetime.datetime.now()
             self.access_token = token_response_data['access_token']
+            self.refresh_token = token_response_data.get('refresh_token', self.refresh_token)  # Spotify may rotate the refresh token.
+            self.update_session_authorization()
             expires_in = token_response_data['expires_in']
             self.expires = self.now + datetime.timedelta(seconds=expires_in)
-            print("\nToken expires at: " + self.expires.strftime("%H:%M:%S"))
-        finally:
+            self.metrics.increment('spotify_token_refresh_total')
+            if verbose:
+                print("\nToken expires at: " + self.expires.strftime("%H:%M:%S"))
+            if self.token_callback is not None:
+                self.token_callback(self.access_token, self.refresh_token)
             return self.access_token
 
-    def is_expire(self):
-        now = self.now
-        expires = self.expires
-        return now > expires
-
-    def extract_tracks_IDs_from_playlist(self, playlist_ID):
-
-        tracks_IDs_list = list()
-        playlist_ID = playlist_ID
-
+    def refresh_expired_access_token(self, expired_access_token):  # Called on a 401, only the first thread with the expired token refresh it.
+        with self.token_lock:
+            if self.access_token != expired_access_token:
+                return True
+            return bool(self.refresh(verbose=False))
+
+    def is_expire(self, margin=0):  # True if the access token expires in less than margin seconds.
+        return datetime.datetime.now() + datetime.timedelta(seconds=margin) >= self.expires
+
+    def start_token_refresher(self, margin=None):
+        """Renew the access token in a background thread margin seconds before each expiry, so long extractions never stall on auth."""
+        if self.token_refresher is not None and self.token_refresher.is_alive():
+            return
+        if margin is not None:
+            self.token_refresh_margin = margin
+        self.token_refresher_stop = threading.Event()
+        self.token_refresher = threading.Thread(target=self.run_token_refresher, args=(self.token_refresher_stop,), daemon=True)
+        self.token_refresher.start()
+
+    def stop_token_refresher(self):
+        if self.token_refresher is not None:
+            self.token_refresher_stop.set()
+            self.token_refresher.join()
+            self.token_refresher = None
+
+    def run_token_refresher(self, stop_event):
+        while not stop_event.is_set():
+            wait_time = (self.expires - datetime.datetime.now()).total_seconds() - self.token_refresh_margin
+            if wait_time > 0:
+                stop_event.wait(min(wait_time, 60))  # Woken up regularly, the expiry can change with a refresh done on a 401.
+            elif not self.refresh(verbose=False):
+                stop_event.wait(self.token_refresh_retry_delay)
+
+    def record_failed_extraction(self, count=1):
+        with self.failed_extractions_lock:
+            self.failed_extractions = self.failed_extractions + count
+
+    def get_failed_extractions(self):  # Compare the values before and after an extraction to know if it is complete.
+        return self.failed_extractions
+
+    def paginate(self, sess, query, params=None):  # Follow the 'next' links and yield the items page by page.
+        while query:
+            try:
+                response_json = self.get_json(sess, query, params=params)
+            except requests.exceptions.RequestException as e:
+                print("Extraction stop because of error: " + str(e))
+                self.record_failed_extraction()
+                return
+            yield from response_json['items']
+            query = response_json['next']
+            params = None  # The 'next' link already contains the query parameters.
+
+    def iter_tracks_IDs_from_playlist(self, playlist_ID):
         query = self.api_url + '/playlists/'f'{playlist_ID}''/tracks'
+        params = {
+            'limit': '100',
+            'fields': 'items(track(id)),next',
+        }
 
         sess = self.get_GET_session()
 
-        offset = '0'
+        for item in self.paginate(sess, query, params=params):
+            if item['track'] is not None and item['track']['id'] is not None:  # Local files and removed tracks have no ID.
+                yield item['track']['id']
 
-        params = {
-            'limit': '100',
-            'offset': offset,
-        }
+    def extract_tracks_IDs_from_playlist(self, playlist_ID):
+        return list(self.iter_tracks_IDs_from_playlist(playlist_ID))
+
+    def extract_last_added_at(self, query):  # The saved items are listed from the newest to the oldest.
+        sess = self.get_GET_session()
 
         try:
-            response = sess.get(query, params=params)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
+            response_json = self.get_json(sess, query, params={'limit': '1'})
+        except requests.exceptions.RequestException as e:
             print(e)
-        else:
-            response_json = response.json()
-            for j in response_json['items']:
-                tracks_IDs_list.append(j['track']['id'])
-        finally:
-            return tracks_IDs_list
+            return None
+        if not response_json['items']:
+            return None
+        return response_json['items'][0]['added_at']
 
-    def extract_saved_tracks_IDs(self):
-        query = self.api_url + '/me/tracks'
-        tracks_IDs_list = list()
+    def extract_saved_tracks_last_added_at(self):
+        return self.extract_last_added_at(self.api_url + '/me/tracks')
 
-        sess = self.get_GET_session()
+    def extract_library_albums_last_added_at(self):
+        return self.extract_last_added_at(self.api_url + '/me/albums')
 
+    def iter_saved_tracks_IDs(self, added_after=None):  # Stop at the first track saved at or before added_after (ISO 8601 timestamp).
+        query = self.api_url + '/me/tracks'
         params = {
             'limit': '50',
-            'offset': '50',
+            'offset': '0',
         }
 
-        try:
-            response = sess.get(query, params=params)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            print(e)
-        else:
-            response_json = response.json()
-            for j in response_json['items']:
-                tracks_IDs_list.append(j['track']['id'])
-        finally:
-            return tracks_IDs_list
+        sess = self.get_GET_session()
+
+        for item in self.paginate(sess, query, params=params):
+            if added_after is not None and item['added_at'] <= added_after:
+                return
+            if item['track']['id'] is not None:
+                yield item['track']['id']
+
+    def extract_saved_tracks_IDs(self):
+        return list(self.iter_saved_tracks_IDs())
 
-    def extract_library_albums_IDs(self, offset=0):
+    def iter_library_albums_IDs(self, added_after=None):  # Stop at the first album saved at or before added_after (ISO 8601 timestamp).
         query = self.api_url + '/me/albums'
-        album_IDs_list = list()
+        params = {
+            'limit': '50',
+            'offset': '0',
+        }
 
         sess = self.get_GET_session()
 
+        for item in self.paginate(sess, query, params=params):
+            if added_after is not None and item['added_at'] <= added_after:
+                return
+            yield item['album']['id']
+
+    def extract_library_albums_IDs(self, added_after=None):
+        return list(self.iter_library_albums_IDs(added_after=added_after))
+
+    def extract_tracks_IDs_from_one_album(self, sess, album_ID):
         params = {
             'limit': '50',
-            'offset': offset,
         }
 
-        try:
-            response = sess.get(query, params=params)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            print(e)
-        else:
+        return [item['id'] for item in self.paginate(sess, self.api_url + '/albums/'f'{album_ID}''/tracks', params=params)]
 
-            response_json = response.json()
-            album_items = response_json['items']
+    def extract_tracks_IDs_from_album(self, album_IDs_list, max_workers=None):
+        max_workers = max_workers or self.max_workers
+        tracks_IDs_list = list()
 
-            for i in album_items:
-                album_IDs_list.append(i['album']['id'])
-        finally:
-            return album_IDs_list
+        sess = self.get_GET_session()
 
-    def extract_tracks_IDs_from_album(self, album_IDs_list):
-        album_IDs_list = album_IDs_list
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:  # map() keep the results in the album order.
+            for album_tracks_IDs in executor.map(lambda album_ID: self.extract_tracks_IDs_from_one_album(sess, album_ID), album_IDs_list):
+                tracks_IDs_list.extend(album_tracks_IDs)
+
+        return tracks_IDs_list
+
+    def extract_tracks_IDs_from_several_albums(self, sess, album_IDs_batch):
         tracks_IDs_list = list()
 
+        try:
+            response_json = self.get_json(sess, self.api_url + '/albums', params={'ids': ','.join(album_IDs_batch)})
+        except requests.exceptions.RequestException as e:
+            print("Extraction of albums batch stop because of error: " + str(e))
+            self.record_failed_extraction()
+            return tracks_IDs_list
+
+        for album in response_json['albums']:
+            if album is None:
+                continue
+            album_tracks = album['tracks']
+            for j in album_tracks['items']:
+                tracks_IDs_list.append(j['id'])
+            if album_tracks['next']:  # Albums with more than 50 tracks are embedded partially.
+                tracks_IDs_list.extend(item['id'] for item in self.paginate(sess, album_tracks['next']))
+
+        return tracks_IDs_list
+
+    def iter_tracks_IDs_from_saved_albums(self, batch_size=20):  # Yield the track IDs while the library albums are still listed.
+        batch_size = max(1, min(batch_size, 20))
+        album_IDs = self.iter_library_albums_IDs()
+
         sess = self.get_GET_session()
 
-        params = {
-                    'limit': '50',
-                }
+        batch = list(itertools.islice(album_IDs, batch_size))
+        while batch:
+            yield from self.extract_tracks_IDs_from_several_albums(sess, batch)
+            batch = list(itertools.islice(album_IDs, batch_size))
 
-        for i in album_IDs_list:
-            try:
-                response = sess.get(self.api_url + '/albums/'f'{i}''/tracks', params=params)
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == '429':
-                    time.sleep(int(e.response.header['retry-after']))
-                    try:
-                        response = sess.get(self.api_url + '/albums/'f'{i}''/tracks', params=params)
-                        response.raise_for_status()
-                    except requests.exceptions.HTTPError:
-                        print("Extraction stop because of error: " + e.response.reason)
-                        break
-                    else:
-                        response_json = response.json()
-                        for j in response_json['items']:
-                            tracks_IDs_list.append(j['id'])
-            else:
-                response_json = response.json()
-                for j in response_json['items']:
-                    tracks_IDs_list.append(j['id'])
+    def extract_tracks_IDs_from_albums_in_batches(self, album_IDs_list, batch_size=20, max_workers=None):
+        max_workers = max_workers or self.max_workers
+        batch_size = max(1, min(batch_size, 20))  # The API accepts at most 20 album IDs per request.
+        batches = [album_IDs_list[i:i + batch_size] for i in range(0, len(album_IDs_list), batch_size)]
+        tracks_IDs_list = list()
+
+        sess = self.get_GET_session()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch_tracks_IDs in executor.map(lambda batch: self.extract_tracks_IDs_from_several_albums(sess, batch), batches):
+                tracks_IDs_list.extend(batch_tracks_IDs)
 
         return tracks_IDs_list
 
@@ -311,53 +538,72 @@ class SpotifyAPI(object):
 
         for i, item in enumerate(track_IDs_list):
             try:
-                response = sess.get(query + f'{item}')
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == '429':
-                    time.sleep(int(e.response.headers['retry-after']))
-                    try:
-                        response = sess.get(query + f'{item}')
-                        response.raise_for_status()
-                    except requests.exceptions.HTTPError:
-                        print("Extraction stop because of error: " + e.response.text)
-                        break
-                    else:
-                        response_json = response.json()
-                        tracks_data.append(response_json)
-                        print("Extraction of track " + str(i+1) + " out of " + str(tracks_counter))
+                response_json = self.get_json(sess, query + f'{item}')
+            except requests.exceptions.RequestException as e:
+                print("\nExtraction of track " + item + " failed because of error: " + str(e))
+                self.record_failed_extraction()
             else:
-                response_json = response.json()
-                tracks_data.append(response_json)
+                tracks_data.append(TrackRecord.from_dict(response_json))
                 print("Extraction of track " + str(i+1) + " out of " + str(tracks_counter), end='\r')
 
         return tracks_data
 
-    def extract_list_of_user_playlist(self):
-        user_id = self.user_id
-        playlist_info = list()
+    def extract_tracks_data_of_one_batch(self, sess, track_IDs_batch, cache=None):  # cache is a connected DataManager.
+        query = self.api_url + '/audio-features'
+        batch_data = cache.read_cached_tracks_data(track_IDs_batch) if cache is not None else dict()
+        missing_IDs = [track_ID for track_ID in track_IDs_batch if track_ID not in batch_data]
+
+        if missing_IDs:
+            response_json = self.get_json(sess, query, params={'ids': ','.join(missing_IDs)})  # Only the batch that failed is requested again.
+            fetched_data = [TrackRecord.from_dict(item) for item in response_json['audio_features'] if item is not None]  # Tracks without features are returned as null.
+            if cache is not None:
+                cache.write_tracks_data_to_cache(fetched_data)
+            batch_data.update((item['id'], item) for item in fetched_data)
 
-        query = 'https://api.spotify.com/v1/users/'f'{user_id}''/playlists'
+        return [batch_data[track_ID] for track_ID in track_IDs_batch if track_ID in batch_data]
+
+    def iter_tracks_data_in_batches(self, track_IDs, batch_size=100, cache=None):  # Yield the tracks data batch by batch.
+        batch_size = max(1, min(batch_size, 100))  # The API accepts at most 100 IDs per request.
+        track_IDs = iter(track_IDs)  # Any iterable works, so the IDs can be streamed from the paginated extraction.
+        failed_batches = 0
 
         sess = self.get_GET_session()
 
-        try:
-            response = sess.get(query)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429:
-                time.sleep(int(e.response.headers['retry-after']))
-                try:
-                    response = sess.get(query)
-                    response.raise_for_status()
-                except requests.exceptions.HTTPError:
-                    print("Extraction stop because of error: " + e.response.text)
-        else:
-            reponse_json = response.json()
-            for item in reponse_json['items']:
-                playlist_info.append([item['name'], item['id']])
-        finally:
-            return playlist_info
+        batch_index = 0
+        batch = list(itertools.islice(track_IDs, batch_size))
+        while batch:
+            batch_index = batch_index + 1
+            try:
+                yield self.extract_tracks_data_of_one_batch(sess, batch, cache=cache)
+            except requests.exceptions.RequestException:
+                failed_batches = failed_batches + 1
+                self.record_failed_extraction()
+            print("Extraction of batch " + str(batch_index), end='\r')
+            batch = list(itertools.islice(track_IDs, batch_size))
+
+        if failed_batches:
+            print("\nExtraction failed for " + str(failed_batches) + " batch(es) of tracks.")
+
+    def extract_tracks_data_in_batches(self, track_IDs, batch_size=100, cache=None):
+        tracks_data = list()
+        for batch_data in self.iter_tracks_data_in_batches(track_IDs, batch_size=batch_size, cache=cache):
+            tracks_data.extend(batch_data)
+
+        return tracks_data
+
+    def iter_user_playlists(self):
+        query = self.api_url + '/users/'f'{self.user_id}''/playlists'
+        params = {
+            'limit': '50',
+        }
+
+        sess = self.get_GET_session()
+
+        for item in self.paginate(sess, query, params=params):
+            yield [item['name'], item['id'], item['snapshot_id']]
+
+    def extract_list_of_user_playlist(self):
+        return list(self.iter_user_playlists())
 
     def create_a_playlist(self, playlist_name):
         playlist_name = playlist_name
@@ -374,9 +620,8 @@ class SpotifyAPI(object):
         sess = self.get_POST_session()
 
         try:
-            response = sess.post(query, json=data)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
+            response = self.send_request('POST', query, sess=sess, idempotent=False, json=data)
+        except requests.exceptions.RequestException as e:
             print(e)
         else:
             response_json = response.json()
@@ -384,24 +629,49 @@ class SpotifyAPI(object):
         finally:
             return playlist_id
 
-    def add_tracks_to_a_playlist(self, playlist_ID, track_URIs):
-        track_URIs = track_URIs
-        playlist_ID = playlist_ID
-
+    def add_tracks_to_a_playlist_in_chunks(self, playlist_ID, track_URIs, chunk_size=100):
         query = self.api_url + '/playlists/'f'{playlist_ID}''/tracks'
-
-        data = {
-            'uris': track_URIs,
+        chunk_size = max(1, min(chunk_size, 100))  # The API accepts at most 100 URIs per request.
+        result = {
+            'playlist_ID': playlist_ID,
+            'snapshot_id': None,
+            'added_URIs': list(),
+            'failed_URIs': list(),
         }
 
         sess = self.get_POST_session()
 
-        try:
-            response = sess.post(query, json=data)
-            response.raise_for_status()
-            return True
-        except requests.exceptions.HTTPError:
-            return False
+        for i in range(0, len(track_URIs), chunk_size):  # The chunks are sent one after the other to keep the tracks order.
+            chunk = track_URIs[i:i + chunk_size]
+            try:  # The adds are not idempotent, a chunk is only sent again when Spotify did not receive it (429, connection failure).
+                response = self.send_request('POST', query, sess=sess, idempotent=False, json={'uris': chunk})
+            except requests.exceptions.RequestException as e:
+                print("Tracks " + str(i + 1) + " to " + str(i + len(chunk)) + " have not been added because of error: " + str(e))
+                result['failed_URIs'].extend(chunk)
+            else:
+                result['snapshot_id'] = response.json().get('snapshot_id', result['snapshot_id'])
+                result['added_URIs'].extend(chunk)
+
+        return result
+
+    def add_tracks_to_a_playlist(self, playlist_ID, track_URIs):
+        result = self.add_tracks_to_a_playlist_in_chunks(playlist_ID, track_URIs)
+        return not result['failed_URIs']
+
+    def create_playlist_with_tracks(self, playlist_name, track_URIs):
+        playlist_ID = self.create_a_playlist(playlist_name)
+        if not playlist_ID:
+            return {'playlist_ID': '', 'snapshot_id': None, 'added_URIs': list(), 'failed_URIs': list(track_URIs)}
+        return self.add_tracks_to_a_playlist_in_chunks(playlist_ID, track_URIs)
+
+    def create_playlists_with_tracks(self, playlists, max_workers=None):  # playlists: dict of playlist name -> track URIs.
+        max_workers = max_workers or self.max_workers
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {playlist_name: executor.submit(self.create_playlist_with_tracks, playlist_name, track_URIs)
+                       for playlist_name, track_URIs in playlists.items()}
+
+        return {playlist_name: future.result() for playlist_name, future in futures.items()}
 
     def is_user_playlist_name_exist(self, playlist_name):
         playlist_info = self.extract_list_of_user_playlist()
@@ -419,7 +689,7 @@ class SpotifyAPI(object):
             if item[1] == playlist_ID:
                 return True
 
-            return False
+        return False
 
     def get_playlist_ID(self, playlist_name):
         playlist_info = self.extract_list_of_user_playlist()
@@ -0,0 +1,235 @@
+"""
+One-pass statistics for track datasets of any size.
+
+This module provides accumulators that are updated batch by batch while the tracks stream out of SpotifyAPI or of a SQLite cursor:
+- RunningStats: count, mean, variance (Welford / Chan et al. parallel update), min and max,
+- KLLSketch: quantile sketch (median and box plot quartiles) with a memory bounded by its k parameter,
+- FeatureStats: one RunningStats and one KLLSketch for each numeric parameter of the tracks.
+The memory does not depend on the number of tracks, and the accumulators of several sources can be merged.
+
+"""
+
+import math
+import random
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from trackrecord import TrackRecord
+
+
+class RunningStats(object):
+    """Count, mean, variance, min and max updated in one pass."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of the squared differences to the mean.
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, value: float):
+        self.update_many(np.array([value], dtype=float))
+
+    def update_many(self, values: np.ndarray):
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        batch = RunningStats()
+        batch.count = len(values)
+        batch.mean = float(np.mean(values))
+        batch.m2 = float(np.sum((values - batch.mean) ** 2))
+        batch.min = float(np.min(values))
+        batch.max = float(np.max(values))
+        self.merge(batch)
+
+    def merge(self, other: 'RunningStats') -> 'RunningStats':
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self) -> Optional[float]:  # Sample variance like statistics.variance.
+        return self.m2 / (self.count - 1) if self.count > 1 else None
+
+    @property
+    def std(self) -> Optional[float]:
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+
+class KLLSketch(object):
+    """KLL quantile sketch (Karnin, Lang and Liberty).
+
+    The values are kept in compactors, the level h compactor holds values of weight 2**h. When the sketch is full, the fullest compactor
+    is sorted and one value out of two (random offset) moves to the next level. The rank error is about 1.7 / k of the count.
+
+    Parameters
+    ----------
+    k : int
+        size of the biggest compactor, the memory is about 3 * k values
+
+    seed : int, optional
+        seed of the random offsets, for reproducible sketches
+    """
+
+    def __init__(self, k: int = 200, seed: Optional[int] = None):
+        self.k = k
+        self.compactors = [[]]
+        self.count = 0
+        self.rng = random.Random(seed)
+
+    def get_capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def get_size(self) -> int:
+        return sum(len(compactor) for compactor in self.compactors)
+
+    def get_max_size(self) -> int:
+        return sum(self.get_capacity(level) for level in range(len(self.compactors)))
+
+    def update(self, value: float):
+        self.update_many([value])
+
+    def update_many(self, values: Iterable[float]):
+        values = [value for value in values if value is not None and not math.isnan(value)]
+        self.compactors[0].extend(values)
+        self.count = self.count + len(values)
+        self.compress()
+
+    def compress(self):
+        while self.get_size() > self.get_max_size():
+            for level, compactor in enumerate(self.compactors):
+                if len(compactor) >= self.get_capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                    compactor.sort()
+                    kept = [compactor.pop()] if len(compactor) % 2 else []  # An odd value out stays at its level.
+                    offset = self.rng.randint(0, 1)
+                    self.compactors[level + 1].extend(compactor[offset::2])
+                    self.compactors[level] = kept
+                    break
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, compactor in enumerate(other.compactors):
+            self.compactors[level].extend(compactor)
+        self.count = self.count + other.count
+        self.compress()
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the approximate value at the rank q (0 to 1) of the values seen."""
+        weighted_values = sorted((value, 2 ** level) for level, compactor in enumerate(self.compactors) for value in compactor)
+        if not weighted_values:
+            return None
+        total_weight = sum(weight for _, weight in weighted_values)
+        target = q * total_weight
+        cumulative_weight = 0
+        for value, weight in weighted_values:
+            cumulative_weight = cumulative_weight + weight
+            if cumulative_weight >= target:
+                return value
+        return weighted_values[-1][0]
+
+
+class FeatureStats(object):
+    """Streaming statistics of every numeric parameter of a track dataset.
+
+    Parameters
+    ----------
+    parameters : list(str), optional
+        numeric parameters to follow, all the TrackRecord numeric parameters by default
+
+    k : int
+        size parameter of the quantile sketches
+    """
+
+    def __init__(self, parameters: Optional[List[str]] = None, k: int = 200, seed: Optional[int] = None):
+        self.parameters = list(parameters) if parameters is not None else list(TrackRecord.numeric_parameters)
+        self.running_stats = {parameter: RunningStats() for parameter in self.parameters}
+        self.sketches = {parameter: KLLSketch(k=k, seed=seed) for parameter in self.parameters}
+        self.track_count = 0
+
+    def update_columns(self, columns: Dict[str, np.ndarray], track_count: int):
+        for parameter in self.parameters:
+            if parameter in columns:
+                values = np.asarray(columns[parameter], dtype=float)
+                self.running_stats[parameter].update_many(values)
+                self.sketches[parameter].update_many(values.tolist())
+        self.track_count = self.track_count + track_count
+
+    def update_many(self, tracks_data: List[Union[TrackRecord, Dict[str, Any]]]):
+        """Update with one batch of tracks (TrackRecord, API JSON or database rows)."""
+        columns = dict()
+        for parameter in self.parameters:
+            if len(tracks_data) > 0 and isinstance(tracks_data[0], TrackRecord):  # The slots are read directly, None is converted to nan.
+                columns[parameter] = np.fromiter((getattr(record, parameter) for record in tracks_data), dtype=float, count=len(tracks_data))
+                continue
+            values = [item[parameter] if parameter in item.keys() else None for item in tracks_data]
+            columns[parameter] = np.array([value if value is not None else np.nan for value in values], dtype=float)
+        self.update_columns(columns, len(tracks_data))
+
+    def update_from_batches(self, batches: Iterable[List[Union[TrackRecord, Dict[str, Any]]]]) -> 'FeatureStats':
+        """Update from an iterable of batches, like SpotifyAPI.iter_tracks_data_in_batches or DataManager.iter_tracks_data_from_source."""
+        for batch in batches:
+            self.update_many(batch)
+        return self
+
+    def update_from_cursor(self, cursor, batch_size: int = 1000) -> 'FeatureStats':
+        """Update from an executed SQLite cursor, the rows are fetched batch_size at a time."""
+        column_names = [column[0] for column in cursor.description]
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            columns = dict()
+            for index, column_name in enumerate(column_names):
+                if column_name in self.running_stats:
+                    columns[column_name] = np.array([row[index] if row[index] is not None else np.nan for row in rows], dtype=float)
+            self.update_columns(columns, len(rows))
+            rows = cursor.fetchmany(batch_size)
+        return self
+
+    def merge(self, other: 'FeatureStats') -> 'FeatureStats':
+        """Add the statistics of another source, a track present in both sources is counted twice."""
+        for parameter in self.parameters:
+            if parameter in other.running_stats:
+                self.running_stats[parameter].merge(other.running_stats[parameter])
+                self.sketches[parameter].merge(other.sketches[parameter])
+        self.track_count = self.track_count + other.track_count
+        return self
+
+    def summary(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """Return count, mean, std, min, quartiles and max of each parameter."""
+        output = dict()
+        for parameter in self.parameters:
+            running_stats = self.running_stats[parameter]
+            sketch = self.sketches[parameter]
+            if running_stats.count == 0:
+                output[parameter] = {'count': 0, 'mean': None, 'std': None, 'min': None, 'q1': None, 'median': None, 'q3': None, 'max': None}
+                continue
+            output[parameter] = {
+                'count': running_stats.count,
+                'mean': running_stats.mean,
+                'std': running_stats.std,
+                'min': running_stats.min,
+                'q1': sketch.quantile(0.25),
+                'median': sketch.quantile(0.5),
+                'q3': sketch.quantile(0.75),
+                'max': running_stats.max,
+            }
+        return output
+
+    def mean_dict(self) -> Dict[str, Optional[float]]:  # Same format as tracksanalyser.mean_dict.
+        return {parameter: round(stats.mean, 2) if stats.count else None for parameter, stats in self.running_stats.items()}
+
+    def std_dict(self) -> Dict[str, Optional[float]]:  # Same format as tracksanalyser.std_dict.
+        return {parameter: round(stats.std, 2) if stats.std is not None else None for parameter, stats in self.running_stats.items()}
@@ -0,0 +1,86 @@
+"""
+Columnar files (Parquet, Arrow IPC / Feather) for the track datasets.
+
+This module converts the tracks of a local source to a columnar file and back. A file holds the track ID and the numeric parameters
+(the uri, href and type strings are rebuilt from the ID like in TrackRecord), one column per parameter, in the source order. The
+analysis can load a file directly into NumPy arrays or a pandas DataFrame, without one Python object per track.
+
+pyarrow is an optional dependency (pip install pyarrow), it is only imported when a file is read or written.
+
+"""
+
+import pathlib
+
+from trackrecord import TrackRecord
+
+file_formats = {'.parquet': 'parquet', '.pq': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow'}
+columns = ('id',) + TrackRecord.numeric_parameters  # Columns of the files, in this order.
+
+
+def get_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("The Parquet and Arrow files need pyarrow, install it with: pip install pyarrow") from e
+    return pyarrow
+
+
+def is_available():
+    try:
+        get_pyarrow()
+    except ImportError:
+        return False
+    return True
+
+
+def get_file_format(path):
+    suffix = pathlib.Path(path).suffix.lower()
+    if suffix not in file_formats:
+        raise ValueError("Unknown file extension " + suffix + ", use one of: " + ', '.join(file_formats))
+    return file_formats[suffix]
+
+
+def get_schema():
+    pa = get_pyarrow()
+    return pa.schema([pa.field('id', pa.string())] + [pa.field(parameter, pa.float64()) for parameter in TrackRecord.numeric_parameters])
+
+
+def write_rows(path, row_batches):
+    """Write batches of row tuples (id then the numeric parameters, like the columns variable) and return the number of rows written."""
+    pa = get_pyarrow()
+    schema = get_schema()
+    file_format = get_file_format(path)
+    row_count = 0
+
+    writer = pa.parquet.ParquetWriter(str(path), schema) if file_format == 'parquet' else pa.ipc.new_file(str(path), schema)
+    try:
+        for rows in row_batches:
+            if not rows:
+                continue
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]  # Rows transposed to columns.
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            row_count = row_count + len(rows)
+    finally:
+        writer.close()
+    return row_count
+
+
+def read_table(path):
+    """Return the file as a pyarrow Table."""
+    pa = get_pyarrow()
+    if get_file_format(path) == 'parquet':
+        return pa.parquet.read_table(str(path))
+    with pa.memory_map(str(path), 'r') as source:  # The Arrow IPC file is mapped, not copied.
+        return pa.ipc.open_file(source).read_all()
+
+
+def iter_track_records(path, batch_size=5000):
+    """Yield the tracks of the file as TrackRecord, batch by batch."""
+    for record_batch in read_table(path).to_batches(max_chunksize=batch_size):
+        batch_columns = record_batch.to_pydict()
+        track_IDs = batch_columns['id']
+        parameters = [parameter for parameter in TrackRecord.numeric_parameters if parameter in batch_columns]
+        for i, track_ID in enumerate(track_IDs):
+            yield TrackRecord(track_ID, **{parameter: batch_columns[parameter][i] for parameter in parameters})
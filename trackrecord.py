@@ -0,0 +1,93 @@
+"""
+Compact record for the audio features of one track.
+
+This module provides the TrackRecord class that move through the whole pipeline (SpotifyAPI, DataManager and tracksanalyser) instead of
+the 18 keys dict returned by the Spotify API.
+
+"""
+
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class TrackRecord(object):
+    """Audio features of one track.
+
+    The track ID and the numeric parameters are kept in __slots__. The strings repeated in every API response (type, uri, track_href and
+    analysis_url) are not stored, they are rebuilt from the ID when requested. The record can still be read like the API dict
+    (record['tempo'], keys(), items()) so it can be given to the code written for the dict format.
+
+    Parameters
+    ----------
+    track_id : str
+        Spotify track ID
+
+    **parameters : float
+        numeric parameters of the track, missing parameters are None
+    """
+
+    numeric_parameters = ('danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness', 'acousticness', 'instrumentalness', 'liveness',
+                          'valence', 'tempo', 'duration_ms', 'time_signature')
+    columns = ('danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness', 'acousticness', 'instrumentalness', 'liveness', 'valence',
+               'tempo', 'type', 'id', 'uri', 'track_href', 'analysis_url', 'duration_ms', 'time_signature')  # Order of the API dict.
+
+    __slots__ = ('id',) + numeric_parameters
+
+    def __init__(self, track_id: str, **parameters: float):
+        self.id = track_id
+        for parameter in self.numeric_parameters:
+            value = parameters.get(parameter)
+            setattr(self, parameter, float(value) if value is not None else None)
+
+    @classmethod
+    def from_dict(cls, data: Any) -> 'TrackRecord':
+        """Build the record from an API dict, a sqlite3.Row or any mapping with the same keys."""
+        keys = data.keys()
+        return cls(data['id'], **{parameter: data[parameter] for parameter in cls.numeric_parameters if parameter in keys})
+
+    @property
+    def uri(self) -> str:
+        return 'spotify:track:' + self.id
+
+    @property
+    def type(self) -> str:
+        return 'audio_features'
+
+    @property
+    def track_href(self) -> str:
+        return 'https://api.spotify.com/v1/tracks/' + self.id
+
+    @property
+    def analysis_url(self) -> str:
+        return 'https://api.spotify.com/v1/audio-analysis/' + self.id
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.columns:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __repr__(self):
+        return 'TrackRecord(' + self.id + ', tempo=' + str(self.tempo) + ')'
+
+    def __eq__(self, other):
+        return isinstance(other, TrackRecord) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.columns
+
+    def values(self) -> Iterator[Any]:
+        return (getattr(self, key) for key in self.columns)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return ((key, getattr(self, key)) for key in self.columns)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the full API dict, with the rebuilt strings."""
+        return dict(self.items())
+
+    def as_compact_dict(self) -> Dict[str, Any]:
+        """Return only the stored values, from_dict() accepts it."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def convert_to_track_records(tracks_data: List[Any]) -> List[TrackRecord]:
+    return [item if isinstance(item, TrackRecord) else TrackRecord.from_dict(item) for item in tracks_data]
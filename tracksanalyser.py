@@ -2,24 +2,337 @@
 Statistic and graph generator for track dataset.
 
 This module provides functions for calculating statistics for the track dataset received from the Spotify API.
+pandas and matplotlib are only imported the first time a dataframe or a graph is requested, the filters and the statistics only need
+NumPy.
 
 """
 
-import statistics
-import pandas as pd
-from matplotlib import pyplot as plt
-from matplotlib import style
-from typing import List, Dict, Optional, Union, Any, Tuple
-style.use('fivethirtyeight')
+import bisect
+import hashlib
+import pathlib
+import re
+import numpy as np
+import trackfiles
+from typing import List, Dict, Optional, Union, Any, Tuple, TYPE_CHECKING
+from trackrecord import TrackRecord
 
+if TYPE_CHECKING:
+    import pandas as pd
 
-def convert_dataset_to_panda_dataframe(tracks_data: List[Dict[str, Union[float, str]]]) -> pd.DataFrame:
+_modules = dict()  # Lazily imported modules, by name.
+figure_style = 'fivethirtyeight'  # matplotlib style of the rendered graphs.
+
+
+def get_pandas():
+    if 'pandas' not in _modules:
+        import pandas
+        _modules['pandas'] = pandas
+    return _modules['pandas']
+
+
+def load_figure_modules():
+    if 'figure' not in _modules:
+        from matplotlib import figure, style
+        from matplotlib.backends import backend_agg
+        _modules['figure'] = figure.Figure
+        _modules['canvas'] = backend_agg.FigureCanvasAgg
+        _modules['style'] = style
+
+
+def get_figure_style():  # The style is read when the axes are created, drawn and cleared, so the whole render must run inside it.
+    load_figure_modules()
+    return _modules['style'].context(figure_style)
+
+
+def create_figure(**kwargs):  # matplotlib Figure without pyplot, it is rendered by the Agg canvas and never opens a window.
+    load_figure_modules()
+    figure = _modules['figure'](**kwargs)
+    _modules['canvas'](figure)
+    return figure
+
+
+def get_pyplot():
+    if 'pyplot' not in _modules:
+        from matplotlib import pyplot, style
+        style.use('fivethirtyeight')
+        _modules['pyplot'] = pyplot
+    return _modules['pyplot']
+
+
+class TrackTable(object):
+    """Columnar container for a track dataset.
+
+    Each numeric parameter is stored in one NumPy array so the filters and statistics run as vectorized operations. The table is built
+    once from the API JSON or the database rows and is never modified by the functions of this module.
+
+    Parameters
+    ----------
+    ids : list(str)
+        track IDs, in the dataset order
+
+    numeric_columns : dict(str, np.ndarray)
+        float array for each numeric parameter
+
+    text_columns : dict(str, np.ndarray)
+        object array for each text parameter
+    """
+
+    def __init__(self, ids, numeric_columns: Dict[str, np.ndarray], text_columns: Dict[str, np.ndarray]):
+        self.ids = np.asarray(ids, dtype=object)
+        self.numeric_columns = numeric_columns
+        self.text_columns = text_columns
+
+    @classmethod
+    def from_tracks_data(cls, tracks_data: List[Dict[str, Union[float, str]]]) -> 'TrackTable':
+        """Build the table from a list of tracks data (TrackRecord, API JSON or database rows converted to dict)."""
+        if len(tracks_data) == 0:
+            return cls([], dict(), dict())
+        if isinstance(tracks_data[0], TrackRecord):
+            return cls.from_track_records(tracks_data)
+        return cls.from_rows([tuple(item.values()) for item in tracks_data], list(tracks_data[0].keys()))
+
+    @classmethod
+    def from_track_records(cls, track_records: List[TrackRecord]) -> 'TrackTable':
+        """Build the table from TrackRecord objects, reading their slots directly."""
+        count = len(track_records)
+        ids = [record.id for record in track_records]
+        numeric_columns = {parameter: np.fromiter((getattr(record, parameter) for record in track_records), dtype=float, count=count)
+                           for parameter in TrackRecord.numeric_parameters}  # A missing parameter (None) is converted to nan.
+        text_columns = {
+            'id': np.array(ids, dtype=object),
+            'uri': np.array(['spotify:track:' + track_id for track_id in ids], dtype=object),
+        }
+        return cls(ids, numeric_columns, text_columns)
+
+    @classmethod
+    def from_file(cls, path: Union[str, pathlib.Path]) -> 'TrackTable':
+        """Build the table from a Parquet/Arrow file exported from the local database, each column is converted to NumPy directly."""
+        arrow_table = trackfiles.read_table(path)
+        ids = arrow_table.column('id').to_pylist()
+        numeric_columns = {name: arrow_table.column(name).to_numpy(zero_copy_only=False).astype(float, copy=False)
+                           for name in arrow_table.column_names if name != 'id'}  # A null value is converted to nan.
+        text_columns = {
+            'id': np.array(ids, dtype=object),
+            'uri': np.array(['spotify:track:' + track_id for track_id in ids], dtype=object),
+        }
+        return cls(ids, numeric_columns, text_columns)
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple], column_names: List[str]) -> 'TrackTable':
+        """Build the table from row tuples, like the ones returned by a SQLite cursor."""
+        numeric_columns = dict()
+        text_columns = dict()
+        ids = list()
+
+        for index, column_name in enumerate(column_names):
+            values = [row[index] for row in rows]
+            if column_name == 'id':
+                ids = values
+                text_columns[column_name] = np.array(values, dtype=object)
+                continue
+            try:
+                numeric_columns[column_name] = np.array(values, dtype=float)
+            except (TypeError, ValueError):
+                text_columns[column_name] = np.array(values, dtype=object)
+
+        return cls(ids, numeric_columns, text_columns)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_parameter_list(self) -> List[str]:
+        return list(self.numeric_columns.keys())
+
+    def select(self, mask: np.ndarray) -> 'TrackTable':
+        """Return a new table with only the tracks selected by a boolean mask or an array of indexes."""
+        return TrackTable(self.ids[mask], {key: value[mask] for key, value in self.numeric_columns.items()},
+                          {key: value[mask] for key, value in self.text_columns.items()})
+
+    def range_mask(self, parameter: str, lower_value: float, upper_value: float) -> np.ndarray:
+        column = self.numeric_columns[parameter]
+        return (column >= lower_value) & (column <= upper_value)
+
+    def mean(self) -> Dict[str, Union[float, None]]:  # The missing values (NaN) are ignored, like in streamingstats.RunningStats.
+        mean_values = {key: round(float(np.nanmean(value)), 2) if np.count_nonzero(~np.isnan(value)) > 0 else None
+                       for key, value in self.numeric_columns.items()}
+        mean_values.update((key, None) for key in self.text_columns)
+        return mean_values
+
+    def std(self) -> Dict[str, Union[float, None]]:  # Sample stdev like statistics.stdev, the missing values (NaN) are ignored.
+        std_values = {key: round(float(np.nanstd(value, ddof=1)), 2) if np.count_nonzero(~np.isnan(value)) > 1 else None
+                      for key, value in self.numeric_columns.items()}
+        std_values.update((key, None) for key in self.text_columns)
+        return std_values
+
+    def get_hash(self) -> str:
+        """Return a SHA-256 of the track IDs and of the numeric columns, it changes as soon as one value of the dataset changes."""
+        dataset_hash = hashlib.sha256('\n'.join(str(track_id) for track_id in self.ids).encode())
+        for parameter in sorted(self.numeric_columns):
+            dataset_hash.update(parameter.encode())
+            dataset_hash.update(np.ascontiguousarray(self.numeric_columns[parameter]).tobytes())
+        return dataset_hash.hexdigest()
+
+    def to_tracks_data(self) -> List[Dict[str, Union[float, str]]]:
+        columns = dict(self.numeric_columns)
+        columns.update(self.text_columns)
+        return [{key: value[i] for key, value in columns.items()} for i in range(len(self))]
+
+
+class TempoIndex(object):
+    """Sorted tempo index for a track dataset.
+
+    The index is built once per loaded dataset, each tempo ± tolerance request is then answered with two bisections in O(log n + k)
+    instead of a scan of the whole dataset. Half-time and double-time tracks share the same beat and can be included in the result.
+
+    Parameters
+    ----------
+    tracks_data : TrackTable or list(dict(string))
+        dataset to index on its tempo parameter
+    """
+
+    def __init__(self, tracks_data: Union[TrackTable, List[Dict[str, Union[float, str]]]]):
+        self.tracks_table = convert_to_track_table(tracks_data)
+        tempo = self.tracks_table.numeric_columns.get('tempo', np.array([], dtype=float))
+        self.order = np.argsort(tempo, kind='stable')
+        self.order = self.order[~np.isnan(tempo[self.order])]  # The tracks without tempo are not indexed, like the SQLite BETWEEN filter.
+        self.sorted_tempo = tempo[self.order].tolist()
+
+    def query_indexes(self, tempo: float, tolerance: float, include_multiples: bool = False) -> np.ndarray:
+        """Return the dataset indexes of the tracks inside tempo ± tolerance (and its half and double if requested), in dataset order."""
+        targets = [tempo, tempo / 2, tempo * 2] if include_multiples else [tempo]
+        ranges = list()
+
+        for target in targets:
+            lower_index = bisect.bisect_left(self.sorted_tempo, target - target * tolerance)
+            upper_index = bisect.bisect_right(self.sorted_tempo, target + target * tolerance)
+            ranges.append(self.order[lower_index:upper_index])
+
+        return np.unique(np.concatenate(ranges))  # The ranges of the multiples can overlap with a large tolerance.
+
+    def query(self, tempo: float, tolerance: float, include_multiples: bool = False) -> TrackTable:
+        return self.tracks_table.select(self.query_indexes(tempo, tolerance, include_multiples))
+
+
+class FeatureMatrix(object):
+    """Normalized feature matrix for multi-parameter searches on a track dataset.
+
+    Each numeric parameter is scaled between 0 and 1 once, so compound range filters are a product of vectorized masks and the tracks
+    nearest to a target profile are found with one distance computation and a partial sort.
+
+    Parameters
+    ----------
+    tracks_data : TrackTable or list(dict(string))
+        dataset to search
+
+    parameters : list(str), optional
+        parameters included in the matrix, all the numeric parameters by default
+    """
+
+    def __init__(self, tracks_data: Union[TrackTable, List[Dict[str, Union[float, str]]]], parameters: Optional[List[str]] = None):
+        self.tracks_table = convert_to_track_table(tracks_data)
+        self.parameters = list(parameters) if parameters is not None else self.tracks_table.get_parameter_list()
+        self.parameter_index = {parameter: i for i, parameter in enumerate(self.parameters)}
+        self.matrix = np.column_stack([self.tracks_table.numeric_columns[parameter] for parameter in self.parameters]) \
+            if len(self.tracks_table) else np.empty((0, len(self.parameters)))
+        self.minimum = np.zeros(len(self.parameters))
+        span = np.zeros(len(self.parameters))
+        has_values = ~np.isnan(self.matrix).all(axis=0)
+        if has_values.any():  # The missing values (NaN) are ignored, they stay NaN once normalized.
+            self.minimum[has_values] = np.nanmin(self.matrix[:, has_values], axis=0)
+            span[has_values] = np.nanmax(self.matrix[:, has_values], axis=0) - self.minimum[has_values]
+        self.span = np.where(span > 0, span, 1.0)
+        self.normalized = (self.matrix - self.minimum) / self.span
+
+    def range_mask(self, conditions: List[Tuple[str, float, float]]) -> np.ndarray:
+        """Return the mask of the tracks inside every (parameter, lower value, upper value) condition."""
+        mask = np.ones(len(self.tracks_table), dtype=bool)
+        for parameter, lower_value, upper_value in conditions:
+            column = self.matrix[:, self.parameter_index[parameter]]
+            mask &= (column >= lower_value) & (column <= upper_value)
+        return mask
+
+    def nearest_indexes(self, target: Dict[str, float], count: int, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return the indexes of the count tracks nearest to the target profile, nearest first, among the tracks of the mask."""
+        columns = [self.parameter_index[parameter] for parameter in target]
+        normalized_target = (np.array(list(target.values()), dtype=float) - self.minimum[columns]) / self.span[columns]
+        candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(self.tracks_table))
+        distances = np.linalg.norm(self.normalized[np.ix_(candidates, columns)] - normalized_target, axis=1)
+        distances[np.isnan(distances)] = np.inf  # The tracks with a missing value are ranked last.
+
+        if count < len(candidates):
+            nearest = np.argpartition(distances, count)[:count]
+        else:
+            nearest = np.arange(len(candidates))
+        return candidates[nearest[np.argsort(distances[nearest], kind='stable')]]
+
+    def query(self, conditions: List[Tuple[str, float, float]], target: Optional[Dict[str, float]] = None, count: Optional[int] = None) -> TrackTable:
+        """Filter the tracks on all the conditions, then rank them by distance to the target profile and keep the first count tracks."""
+        mask = self.range_mask(conditions)
+        if target:
+            indexes = self.nearest_indexes(target, count if count is not None else int(mask.sum()), mask)
+        else:
+            indexes = np.flatnonzero(mask)[:count]
+        return self.tracks_table.select(indexes)
+
+
+def parse_feature_query(query: str) -> Tuple[List[Tuple[str, float, float]], Dict[str, float]]:
+    """Parse a feature query like 'tempo=165±5%, energy>0.7, danceability~0.8'.
+
+    Parameters
+    ----------
+    query : str
+        comma separated conditions: 'parameter=value±tolerance' (tolerance in % or in the parameter unit), 'parameter>value',
+        'parameter>=value', 'parameter<value', 'parameter<=value', or 'parameter~value' to rank the tracks by distance to this value
+
+    Returns
+    -------
+    conditions, target: list(tuple(str, float, float)), dict(str, float)
+        range conditions (parameter, lower value, upper value) and target profile
+    """
+    conditions = list()
+    target = dict()
+
+    for item in query.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        match = re.fullmatch(r'(\w+)\s*(>=|<=|>|<|=|~)\s*([-+]?[\d.]+)\s*(?:(?:±|\+-|\+/-)\s*([\d.]+)\s*(%?))?', item)
+        if match is None:
+            raise ValueError("Invalid feature condition: " + item)
+        parameter, operator, value, tolerance, percent = match.groups()
+        value = float(value)
+
+        if operator == '~':
+            target[parameter] = value
+        elif operator == '=':
+            tolerance = float(tolerance) if tolerance else 0.0
+            tolerance = abs(value) * tolerance / 100 if percent else tolerance
+            conditions.append((parameter, value - tolerance, value + tolerance))
+        elif operator in ('>', '>='):
+            conditions.append((parameter, value if operator == '>=' else float(np.nextafter(value, np.inf)), np.inf))
+        else:
+            conditions.append((parameter, -np.inf, value if operator == '<=' else float(np.nextafter(value, -np.inf))))
+
+    return conditions, target
+
+
+def convert_to_track_table(tracks_data: Union[TrackTable, str, pathlib.Path, List[Dict[str, Union[float, str]]]]) -> TrackTable:
+    if isinstance(tracks_data, TrackTable):
+        return tracks_data
+    if isinstance(tracks_data, (str, pathlib.Path)):
+        return TrackTable.from_file(tracks_data)
+    return TrackTable.from_tracks_data(list(tracks_data))
+
+
+def convert_dataset_to_panda_dataframe(tracks_data: Union[str, pathlib.Path, List[Union[TrackRecord, Dict[str, Union[float, str]]]]]) \
+        -> 'pd.DataFrame':
     """Convert dataset into panda dataframe.
 
     Parameters
     ----------
-    tracks_data: list(dict(str))
-        dataset that need to be converted into panda dataframe
+    tracks_data: list(TrackRecord) or list(dict(str)) or str
+        dataset that need to be converted into panda dataframe, or the path of a Parquet/Arrow file exported from the local database
+        (loaded column by column, without any Python object per track)
 
     Returns
     -------
@@ -27,7 +340,13 @@ def convert_dataset_to_panda_dataframe(tracks_data: List[Dict[str, Union[float,
         dataset converted into pd.dataframe
     """
 
-    tracks_dataframe = pd.DataFrame(tracks_data)
+    pd = get_pandas()
+    if isinstance(tracks_data, (str, pathlib.Path)):
+        return trackfiles.read_table(tracks_data).to_pandas()
+    if len(tracks_data) > 0 and isinstance(tracks_data[0], TrackRecord):
+        tracks_dataframe = pd.DataFrame([record.as_compact_dict() for record in tracks_data])
+    else:
+        tracks_dataframe = pd.DataFrame(tracks_data)
     return tracks_dataframe
 
 
@@ -55,19 +374,21 @@ def extract_track_by_parameter_and_value(tracks_data: List[Dict[str, Union[float
         list dataset with only the items inside the value ± tolerance
 
     """
-    tracks_data = list(tracks_data)
     lower_spec = value - value*tolerance
     upper_spec = value + value*tolerance
-    output_tracks = list()
+    tracks_table = convert_to_track_table(tracks_data)
+    mask = tracks_table.range_mask(parameter, lower_spec, upper_spec)
 
-    for item in tracks_data:
-        if lower_spec <= item[parameter] <= upper_spec:
-            output_tracks.append(item)
+    if isinstance(tracks_data, TrackTable):
+        return tracks_table.select(mask)
+    tracks_data = list(tracks_data)
+    return [tracks_data[i] for i in np.flatnonzero(mask)]
 
-    return output_tracks
 
+def extract_tracks_URI_IDs(tracks_data: Union[TrackTable, List[Dict[str, Union[float, str]]]]) -> List[str]:
+    if isinstance(tracks_data, TrackTable):
+        return list(tracks_data.text_columns['uri'])
 
-def extract_tracks_URI_IDs(tracks_data: List[Dict[str, Union[float, str]]]) -> List[str]:
     output_URI_IDs = list()
     for track in tracks_data:
         output_URI_IDs.append(track['uri'])
@@ -75,19 +396,19 @@ def extract_tracks_URI_IDs(tracks_data: List[Dict[str, Union[float, str]]]) -> L
     return output_URI_IDs
 
 
-def extract_stats_from_tracks(tracks_data: List[Dict[str, Union[float, str]]]) \
+def extract_stats_from_tracks(tracks_data: Union[TrackTable, List[Dict[str, Union[float, str]]]]) \
         -> Tuple[Dict[Any, Union[Optional[float], Any]], Dict[Any, Union[Union[float, None], Any]]]:
 
-    tracks_data = tracks_data
-    tracks_data[:] = [convert_values_to_float(item) for item in tracks_data]
-    mean_dict_value = mean_dict(tracks_data)
-    std_dict_value = std_dict(tracks_data)
+    tracks_table = convert_to_track_table(tracks_data)  # The caller dataset is not modified.
+    mean_dict_value = mean_dict(tracks_table)
+    std_dict_value = std_dict(tracks_table)
 
     return mean_dict_value, std_dict_value
 
 
-def generate_histogram_for_stat(tracks_dataframe: pd.DataFrame, parameter: str):
+def generate_histogram_for_stat(tracks_dataframe: 'pd.DataFrame', parameter: str):
     if str(parameter) in tracks_dataframe.columns:
+        plt = get_pyplot()
 
         # the histogram of the data
         plt.hist(tracks_dataframe[str(parameter)], facecolor='blue')
@@ -104,9 +425,10 @@ def generate_histogram_for_stat(tracks_dataframe: pd.DataFrame, parameter: str):
         print("Paramter" f"{str(parameter)}" "does not exist in the dataframe")
 
 
-def generate_boxplot_for_specific_stat(tracks_dataframe: pd.DataFrame, parameter: str):
+def generate_boxplot_for_specific_stat(tracks_dataframe: 'pd.DataFrame', parameter: str):
 
     if str(parameter) in tracks_dataframe.columns:
+        plt = get_pyplot()
         plt.boxplot(tracks_dataframe[str(parameter)])
         plt.xlabel('Unit from 0 to 1 (0: no ' + parameter + ' )')
         plt.ylabel(parameter)
@@ -116,7 +438,87 @@ def generate_boxplot_for_specific_stat(tracks_dataframe: pd.DataFrame, parameter
         print("Paramter" f"{str(parameter)}" "does not exist in the dataframe")
 
 
-def extract_parameter_list(tracks_data: List[Dict[str, Union[float, str]]]) -> List[str]:
+def draw_parameter_panels(histogram_axes, boxplot_axes, parameter: str, values: np.ndarray):
+    values = values[~np.isnan(values)]
+    histogram_axes.hist(values, facecolor='blue')
+    histogram_axes.set_xlabel(parameter)
+    histogram_axes.set_ylabel('Number of occurence')
+    histogram_axes.set_title('Histogram for ' + parameter + ' parameter')
+    histogram_axes.grid(True)
+    boxplot_axes.boxplot(values)
+    boxplot_axes.set_ylabel(parameter)
+    boxplot_axes.set_title('Box plot for ' + parameter + ' parameter')
+
+
+def render_statistics_graphs(tracks_data: Union[TrackTable, List[Dict[str, Union[float, str]]]], output_directory: str,
+                             file_format: str = 'png', layout: str = 'grid', parameters: Optional[List[str]] = None) -> List[str]:
+    """Render the histogram and the box plot of every numeric parameter in one pass, without any GUI.
+
+    Parameters
+    ----------
+    tracks_data: TrackTable or list(dict(str))
+        dataset to render
+
+    output_directory: str
+        directory of the rendered files, it also holds the cache of the previous renders
+
+    file_format: str
+        'png' or 'svg'
+
+    layout: str
+        'grid' for one figure with one row of panels per parameter, 'files' for one file per parameter
+
+    parameters: list(str), optional
+        parameters to render, all the numeric parameters with at least one value by default
+
+    Returns
+    -------
+    paths
+        paths of the rendered files. The file names start with the dataset hash, so a render of an unchanged dataset returns the files of
+        the previous render without drawing anything.
+    """
+    if layout not in ('grid', 'files'):
+        raise ValueError("Unknown layout " + layout + ", use 'grid' or 'files'")
+
+    tracks_table = convert_to_track_table(tracks_data)
+    if parameters is None:
+        parameters = [parameter for parameter, values in tracks_table.numeric_columns.items() if not np.all(np.isnan(values))]
+
+    render_key = hashlib.sha256('|'.join([tracks_table.get_hash(), figure_style, file_format, layout] + parameters).encode()).hexdigest()[:16]
+    directory = pathlib.Path(output_directory)
+    if layout == 'grid':
+        paths = [directory / (render_key + '_statistics.' + file_format)]
+    else:
+        paths = [directory / (render_key + '_' + parameter + '.' + file_format) for parameter in parameters]
+    if all(path.is_file() for path in paths):  # Cache hit.
+        return [str(path) for path in paths]
+
+    directory.mkdir(parents=True, exist_ok=True)
+    with get_figure_style():
+        if layout == 'grid':
+            figure = create_figure(figsize=(12, 4 * max(1, len(parameters))))
+            axes = figure.subplots(max(1, len(parameters)), 2, squeeze=False)
+            figure.subplots_adjust(left=0.08, right=0.97, top=1 - 0.3 / len(axes), bottom=0.4 / len(axes), hspace=0.45, wspace=0.25)
+            for row, parameter in enumerate(parameters):
+                draw_parameter_panels(axes[row][0], axes[row][1], parameter, tracks_table.numeric_columns[parameter])
+            figure.savefig(paths[0], format=file_format)
+        else:
+            figure = create_figure(figsize=(12, 4))
+            histogram_axes, boxplot_axes = figure.subplots(1, 2)
+            figure.subplots_adjust(left=0.08, right=0.97, top=0.9, bottom=0.15, wspace=0.25)  # Fixed margins, tight_layout() draws the figure twice.
+            for parameter, path in zip(parameters, paths):  # The same figure and axes are cleared and reused for each parameter.
+                histogram_axes.clear()
+                boxplot_axes.clear()
+                draw_parameter_panels(histogram_axes, boxplot_axes, parameter, tracks_table.numeric_columns[parameter])
+                figure.savefig(path, format=file_format)
+
+    return [str(path) for path in paths]
+
+
+def extract_parameter_list(tracks_data: Union[TrackTable, List[Dict[str, Union[float, str]]]]) -> List[str]:
+    if isinstance(tracks_data, TrackTable):
+        return tracks_data.get_parameter_list()
+
     parameter_list = list()
 
     for key, value in tracks_data[0].items():
@@ -126,30 +528,19 @@ def extract_parameter_list(tracks_data: List[Dict[str, Union[float, str]]]) -> L
     return parameter_list
 
 
-def std_dict(dict_list: List[Dict[str, Union[float, str]]]) -> Dict[str, Union[float, None]]:
-    std_dict_value = {}
-    for key, value in dict_list[0].item():
-        if isinstance(value, float):
-            std_dict_value[key] = round(statistics.stdev(d[key] for d in dict_list), 2)
-        else:
-            std_dict_value[key] = None
-    return std_dict_value
+def std_dict(dict_list: Union[TrackTable, List[Dict[str, Union[float, str]]]]) -> Dict[str, Union[float, None]]:
+    return convert_to_track_table(dict_list).std()
 
 
-def mean_dict(dict_list: List[Dict[str, Union[float, str]]]) -> Dict[str, Union[float, None]]:
-    mean_dict_values = {}
-    for key, value in dict_list[0].items():
-        if isinstance(value, float):
-            mean_dict_values[key] = round(sum(d[key] for d in dict_list) / len(dict_list), 2)
-        else:
-            mean_dict_values[key] = None
-    return mean_dict_values
+def mean_dict(dict_list: Union[TrackTable, List[Dict[str, Union[float, str]]]]) -> Dict[str, Union[float, None]]:
+    return convert_to_track_table(dict_list).mean()
 
 
 def convert_values_to_float(dict_data: Dict[str, Union[float, str]]) -> Dict[str, Union[float, str]]:
+    float_dict_data = dict()
     for key, value in dict_data.items():
         try:
-            dict_data[key] = float(value)
-        except ValueError:
-            continue
-    return dict_data
\ No newline at end of file
+            float_dict_data[key] = float(value)
+        except (TypeError, ValueError):
+            float_dict_data[key] = value
+    return float_dict_data